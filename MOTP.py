@@ -8,29 +8,73 @@ GitHub repository: https://github.com/An-anonymous-coder/MOTP
 
 FUNCTIONS
 ---------
-encrypt(file_path, password, verbose): Encrypts any file. Returns nothing.
+encrypt(file_path, password, verbose, buffer_size, workers, memory_map, progress, in_place, integrity, compression):
+    Encrypts any file. Returns nothing.
 
-decrypt(file_path, password, verbose): Decrypts any file. Returns nothing.
+decrypt(file_path, password, verbose, buffer_size, workers, memory_map, progress, in_place): Decrypts any file. Returns
+    nothing.
 
 destroy(file_path, verbose): Destroys the decryption key for a file. Returns nothing.
+
+rekey(file_path, old_password, new_password, in_place, buffer_size, workers, memory_map, progress): Changes the
+    password of an encrypted file in one pass. Returns the path of the file.
+
+verify(file_path, password, buffer_size, workers): Checks every block of a file encrypted with integrity tags. Returns
+    the path of the file.
+
+open_decrypted(file_path, password, buffer_size): Opens an encrypted file for reading. Returns a file object.
+
+encrypt_stream(source, destination, password, buffer_size, workers, progress, integrity, compression): Encrypts from
+    any binary reader to any binary writer. Returns the number of bytes encrypted.
+
+decrypt_stream(source, destination, password, buffer_size, workers, progress): Decrypts from any binary reader to
+    any binary writer. Returns the number of bytes decrypted.
+
+encrypt_stream_async(reader, writer, password, buffer_size, executor, progress): Encrypts from an
+    asyncio.StreamReader to an asyncio.StreamWriter. Returns the number of bytes encrypted.
+
+decrypt_stream_async(reader, writer, password, buffer_size, executor, progress): Decrypts from an
+    asyncio.StreamReader to an asyncio.StreamWriter. Returns the number of bytes decrypted.
+
+encrypt_many(file_paths, password, jobs, processes, buffer_size, workers, memory_map, in_place, integrity,
+    compression): Encrypts many files at once. Returns a BatchResult.
+
+decrypt_many(file_paths, password, jobs, processes, buffer_size, workers, memory_map, in_place): Decrypts many files
+    at once. Returns a BatchResult.
+
+destroy_many(file_paths, jobs, processes): Destroys the decryption keys for many files at once. Returns a BatchResult.
+
+Progress(callback, total): Collects the bytes processed, the time spent reading, compressing, generating the pad,
+    XORing, tagging and writing, the speed and the ETA of a job. Pass one as `progress` to follow a job while it runs.
+
+log_progress(logger, level, interval): Makes a Progress callback that logs the progress. Returns the callback.
+
+COMMAND LINE
+------------
+python MOTP.py encrypt|decrypt|destroy|verify PATH [PATH ...]: Encrypts, decrypts, destroys the keys for or verifies
+    files, directories (recursively) and glob patterns. The password is read from the MOTP_PASSWORD environment
+    variable, or asked for once. Run with --help for options.
 """
+import collections
+import concurrent.futures
+import copy
+import functools
+import io
+import itertools
+import logging
+import mmap
 import os
+import struct
 import sys
+import threading
 import time
 import typing
 
 import numpy  # https://numpy.org/install/
 
-# I hate `tkinter`'s inconsistency.
-if sys.version_info.major < 3 or sys.version_info.minor < 3:  # For Python 3.2.x and below (Untested)
-    import tkSimpleDialog as dialog
-elif sys.version_info.minor < 6:  # For Python 3.3.x through 3.5.x (Untested)
-    from tkinter import simpledialog as dialog
-else:  # For Python 3.6.x and above (Tested Python 3.10.6)
-    import tkinter
-    import tkinter.simpledialog as dialog
+if typing.TYPE_CHECKING:  # asyncio is slow to import, so it is only imported by the functions that use it.
+    import asyncio
 
-    tkinter.Tk().withdraw()  # Someone said this was necessary (It worked without in Python 3.10.6)
 red = '\u001b[38;2;255;0;0m'
 yellow = '\u001b[38;2;255;255;0m'
 green = '\u001b[38;2;0;255;0m'
@@ -39,10 +83,1509 @@ blue = '\u001b[38;2;0;127;255m'  # Technically azure
 grey = '\u001b[38;2;127;127;127m'
 bold = '\u001b[1m'
 reset = '\u001b[0m'
+format_version = 3
+# This is the newest format version. `encrypt` writes version 2 files, or version 3 files when the blocks are tagged.
+# Version 1 files can still be decrypted.
+default_buffer_size = 16 * 1024 * 1024
+# This is the default size (in bytes) of the buffer used to stream files. It only changes memory usage and speed, not
+# the encrypted output, so a file can be decrypted with a different buffer size than it was encrypted with.
+legacy_chunk_size = 1024 * 1024 * 1024  # This is the chunk size version 1 files were encrypted with.
+header_size_limit = 1024
+# This is the longest header read (in bytes), so data that is not a MOTP file is not read without limit.
+key_slot_size = 32
+# This is the width (in characters) of the decryption key in version 2 headers. Keys are padded with spaces, so
+# `destroy` can overwrite a key in place without moving the data after it.
+sidecar_extensions = ('.MOTP.journal', '.MOTP.rekey')
+# These are the files kept next to an encrypted file while an in-place job or a rekey runs. They are never encrypted.
+journal_line_size = 128  # This is the size (in bytes) of the line describing an in-place job at the start of a journal.
+journal_slot = struct.Struct('<QQI')
+# This is the header of a chunk copy in a journal: its number in the job (starting at 1), its size and its CRC-32.
+default_block_size = 1024 * 1024
+# This is the size (in bytes) of the blocks of version 3 files. Each block is stored after its tag, so a block can be
+# checked and decrypted on its own.
+tag_size = 16  # This is the size (in bytes) of the keyed BLAKE2b tag of each block.
+compressions = ('zlib', 'lzma', 'zstd')
+# These are the compressions version 3 files can use. zstd needs Python 3.14 or the zstandard module.
+record_prefix = struct.Struct('<I')
+# This is stored before the tag of every block of a compressed version 3 file: the size of the stored block, plus
+# `last_block_flag` on the last block and `raw_block_flag` on blocks stored uncompressed because they did not shrink.
+last_block_flag = 1 << 30
+raw_block_flag = 1 << 31
+block_index_footer = struct.Struct('<Q')
+# This ends a compressed version 3 file: the number of blocks, after the index of their sizes (see `_block_index`).
+
+
+class Progress:
+    """
+    This collects the progress of one job: the bytes processed, the time spent reading, compressing (for compressed
+    files), generating the pad, XORing, tagging (for version 3 files) and writing, the speed and the ETA. Pass one to
+    any function with a `progress` parameter. It can be shared by threads, and times from several threads are added
+    together, so the stages can add up to more than the elapsed time. The clock starts when it is created.
+    """
+    stages = ('read', 'compress', 'pad', 'xor', 'tag', 'write')
+
+    def __init__(self, callback: typing.Union[typing.Callable[['Progress', int], None], None] = None,
+                 total: typing.Union[int, None] = None) -> None:
+        """
+        :param callback: This is called with the Progress and the size (in bytes) of the chunk after every chunk, and
+            once more with a size of 0 when the job is finished. It is called from the thread running the job, so it
+            should return quickly. Defaults to None.
+        :type callback: typing.Callable or None
+        :param total: This is the number of bytes in the job. If none is provided, it is set by the functions that
+            know the size of their input. Defaults to None.
+        :type total: int or None
+        """
+        self.callback = callback
+        self.total = total
+        self.done = 0
+        self.seconds = dict.fromkeys(self.stages, 0.0)
+        self.start = time.perf_counter()
+        self.end = None
+        self.lock = threading.Lock()
+
+    def record(self, **seconds: float) -> None:
+        """
+        This adds time to some of the stages.
+        :param float seconds: These are the seconds to add, by stage name.
+        """
+        with self.lock:
+            for stage, stage_seconds in seconds.items():
+                self.seconds[stage] += stage_seconds
+
+    def advance(self, size: int, **seconds: float) -> None:
+        """
+        This records a processed chunk and calls the callback.
+        :param int size: This is the size (in bytes) of the chunk.
+        :param float seconds: These are the seconds to add, by stage name.
+        """
+        with self.lock:
+            self.done += size
+            for stage, stage_seconds in seconds.items():
+                self.seconds[stage] += stage_seconds
+        if self.callback is not None:
+            self.callback(self, size)
+
+    def finish(self) -> None:
+        """
+        This stops the clock and calls the callback one last time.
+        """
+        self.end = time.perf_counter()
+        if self.callback is not None:
+            self.callback(self, 0)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def speed(self) -> float:
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed else 0.0
+
+    @property
+    def eta(self) -> typing.Union[float, None]:
+        """
+        This is the estimated number of seconds left, or None if the total is not known or nothing is done yet.
+        """
+        if self.end is not None:
+            return 0.0
+        speed = self.speed
+        if self.total is None or not speed:
+            return None
+        return max(self.total - self.done, 0) / speed
+
+    def as_dict(self) -> dict:
+        """
+        This returns the progress as a dictionary that can be serialized as JSON.
+        :return: Returns the bytes done, the total, the elapsed time, the speed, the ETA and the time of each stage.
+        :rtype: dict
+        """
+        with self.lock:
+            seconds = dict(self.seconds)
+        return {'done': self.done, 'total': self.total, 'elapsed': self.elapsed, 'speed': self.speed, 'eta': self.eta,
+                'seconds': seconds}
+
+
+def log_progress(logger: typing.Union[logging.Logger, None] = None, level: int = logging.INFO,
+                 interval: float = 1.0) -> typing.Callable[[Progress, int], None]:
+    """
+    This function makes a Progress callback that logs the progress at most once per interval, and always when the job
+    is finished. The record has the result of `Progress.as_dict` as its `motp` attribute, for metrics handlers.
+    :param logger: This is the logger to log to. If none is provided, the 'MOTP' logger is used. Defaults to None.
+    :type logger: logging.Logger or None
+    :param int level: This is the level to log at. Defaults to logging.INFO.
+    :param float interval: This is the shortest time (in seconds) between records. Defaults to 1.
+    :return: Returns the callback.
+    :rtype: typing.Callable
+    """
+    logger = logger or logging.getLogger('MOTP')
+    last = [float('-inf')]
+
+    def callback(progress: Progress, size: int) -> None:
+        now = time.perf_counter()
+        if (size and now - last[0] < interval) or not logger.isEnabledFor(level):
+            return
+        last[0] = now
+        state = progress.as_dict()
+        logger.log(level, '%s %d of %s bytes (%.0f bytes per second, ETA %s)',
+                   'Finished' if not size else 'Processed', state['done'],
+                   'unknown' if state['total'] is None else state['total'], state['speed'],
+                   'unknown' if state['eta'] is None else '{eta:.1f} seconds'.format(eta=state['eta']),
+                   extra={'motp': state})
+
+    return callback
+
+
+class Keystream:
+    """
+    This generates the pad for version 2 and 3 files. The pad is the raw output of a PCG64 bit generator read as
+    little-endian bytes, so it comes out the same no matter how it is split into chunks.
+    """
+
+    def __init__(self, password: str, decryption_key: str) -> None:
+        """
+        :param str password: This is the password used to encrypt the file.
+        :param str decryption_key: This is the decryption key stored in the file header.
+        """
+        self.bit_generator = numpy.random.PCG64(int.from_bytes(bytes((password + decryption_key).encode()), 'big'))
+        # This randomizes the outcome of the encryption in a reversible way.
+        self.state = self.bit_generator.state  # This is kept so the keystream can be rewound.
+        self.position = 0
+        self.spare = numpy.empty(0, dtype=numpy.uint8)  # These are the unused bytes of the last 64-bit word.
+        self.progress = None  # If this is set to a Progress, `apply` records the time spent on the pad and the XOR.
+
+    def words(self, count: int) -> numpy.ndarray:
+        """
+        This draws 64-bit words from the bit generator.
+        :param int count: This is the number of words to draw.
+        :return: Returns the words as a numpy.ndarray of bytes.
+        :rtype: numpy.ndarray
+        """
+        words = self.bit_generator.random_raw(count)
+        if sys.byteorder == 'big':
+            words.byteswap(inplace=True)
+        return words.view(numpy.uint8)
+
+    def seek(self, position: int) -> None:
+        """
+        This moves the keystream to any byte position without generating the bytes before it.
+        :param int position: This is the byte position to move to.
+        """
+        self.bit_generator.state = self.state
+        self.bit_generator.advance(position // 8)
+        self.spare = self.words(1)[position % 8:] if position % 8 else numpy.empty(0, dtype=numpy.uint8)
+        self.position = position
+
+    def split(self, position: int) -> 'Keystream':
+        """
+        This makes an independent copy of the keystream at any byte position, so parts of the pad can be generated on
+        different threads.
+        :param int position: This is the byte position of the copy.
+        :return: Returns the copy.
+        :rtype: Keystream
+        """
+        keystream = copy.copy(self)
+        keystream.bit_generator = numpy.random.PCG64()
+        keystream.seek(position)
+        return keystream
+
+    def apply(self, data: numpy.ndarray, out: typing.Union[numpy.ndarray, None] = None) -> None:
+        """
+        This XORs the next part of the pad into data.
+        :param numpy.ndarray data: This is the data to encrypt or decrypt, as an array of bytes.
+        :param out: This is where the result is stored. If none is provided, data is changed in place. Defaults to None.
+        :type out: numpy.ndarray or None
+        """
+        if out is None:
+            out = data
+        start = time.perf_counter()
+        pad_end = start
+        size = len(data)
+        spare_size = min(len(self.spare), size)
+        if spare_size:
+            numpy.bitwise_xor(data[:spare_size], self.spare[:spare_size], out=out[:spare_size])
+        if size > spare_size:
+            words = self.words(-(-(size - spare_size) // 8))
+            pad_end = time.perf_counter()
+            numpy.bitwise_xor(data[spare_size:], words[:size - spare_size], out=out[spare_size:])
+            self.spare = words[size - spare_size:].copy()  # This lets the words be freed before the next chunk.
+        else:
+            self.spare = self.spare[spare_size:]
+        self.position += size
+        if self.progress is not None:
+            self.progress.record(pad=pad_end - start, xor=time.perf_counter() - pad_end)
+
+
+class KeystreamPair:
+    """
+    This applies two keystreams at once, so data encrypted with one can be moved to the other in a single pass. It can
+    be used anywhere a Keystream is.
+    """
+
+    def __init__(self, first: Keystream, second: Keystream) -> None:
+        """
+        :param Keystream first: This is the first keystream, usually the one the data is encrypted with.
+        :param Keystream second: This is the second keystream, usually the one the data should be encrypted with.
+        """
+        self.first = first
+        self.second = second
+
+    @property
+    def position(self) -> int:
+        return self.first.position
+
+    @property
+    def progress(self) -> typing.Union[Progress, None]:
+        return self.first.progress
+
+    @progress.setter
+    def progress(self, progress: typing.Union[Progress, None]) -> None:
+        self.first.progress = progress
+        self.second.progress = progress
+
+    def seek(self, position: int) -> None:
+        self.first.seek(position)
+        self.second.seek(position)
+
+    def split(self, position: int) -> 'KeystreamPair':
+        return KeystreamPair(self.first.split(position), self.second.split(position))
+
+    def apply(self, data: numpy.ndarray, out: typing.Union[numpy.ndarray, None] = None) -> None:
+        self.first.apply(data, out)
+        self.second.apply(data if out is None else out)
+
+
+def _build_header(decryption_key: str, options: typing.Union[typing.Dict[str, typing.Any], None] = None) -> bytes:
+    """
+    This builds the header written in front of the encrypted data.
+    :param str decryption_key: This is the decryption key to store.
+    :param options: These are the format options, written as 'name=value' after the key. If any are provided, the
+        header is a version 3 header. Otherwise, it is a version 2 header. Defaults to None.
+    :type options: dict or None
+    :return: Returns the header.
+    :rtype: bytes
+    """
+    fields = ['MOTP{version}'.format(version=3 if options else 2), decryption_key.ljust(key_slot_size)]
+    fields.extend('{name}={value}'.format(name=name, value=value) for name, value in (options or {}).items())
+    return (' '.join(fields) + '\n').encode()
+
+
+def _read_header(encrypted_file: typing.BinaryIO) -> typing.Tuple[int, str, typing.Dict[str, str]]:
+    """
+    This reads the header of an encrypted file, leaving the file at the start of the encrypted data. Version 1 headers
+    are just the decryption key.
+    :param encrypted_file: This is the encrypted file, opened in binary mode at its start. Only `read` is used, one
+        byte at a time, so any binary reader works and nothing after the header is consumed.
+    :type encrypted_file: typing.BinaryIO
+    :return: Returns the format version, the decryption key and the format options. The key is not checked.
+    :rtype: tuple
+    """
+    line = bytearray()
+    while len(line) < header_size_limit and not line.endswith(b'\n'):
+        byte = encrypted_file.read(1)
+        if not byte:
+            break
+        line += byte
+    line = line.decode(errors='replace').rstrip()
+    if not line.startswith('MOTP'):
+        return 1, line, {}
+    fields = line.split()
+    try:
+        version = int(fields[0][4:])
+    except ValueError:
+        return 0, '', {}
+    return version, fields[1] if len(fields) > 1 else '', dict(field.partition('=')[::2] for field in fields[2:])
+
+
+def _readinto(source: typing.BinaryIO, view: memoryview) -> int:
+    """
+    This reads into a buffer, also from readers that only have `read`.
+    :param source: This is the reader.
+    :type source: typing.BinaryIO
+    :param memoryview view: This is the buffer.
+    :return: Returns the number of bytes read. 0 means the end of the data.
+    :rtype: int
+    """
+    if hasattr(source, 'readinto'):
+        return source.readinto(view) or 0
+    data = source.read(len(view))
+    view[:len(data)] = data
+    return len(data)
+
+
+def _readinto_full(source: typing.BinaryIO, view: memoryview) -> int:
+    """
+    This reads into a buffer until it is full or the data runs out. Pipes and sockets can return less than asked for,
+    and the block format needs whole blocks.
+    :param source: This is the reader.
+    :type source: typing.BinaryIO
+    :param memoryview view: This is the buffer.
+    :return: Returns the number of bytes read. Anything less than the size of the buffer means the end of the data.
+    :rtype: int
+    """
+    total = 0
+    while total < len(view):
+        size = _readinto(source, view[total:])
+        if not size:
+            break
+        total += size
+    return total
+
+
+def _apply_keystream(source: typing.BinaryIO, destination: typing.BinaryIO, keystream: Keystream,
+                     chunk_size: int = default_buffer_size, workers: int = 1,
+                     progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This streams the rest of one file into another, XORing it with the keystream on the way. Only one chunk is held in
+    memory at a time, or two per worker when more than one worker is used.
+    :param source: This is the file to read from.
+    :type source: typing.BinaryIO
+    :param destination: This is the file to write to.
+    :type destination: typing.BinaryIO
+    :param Keystream keystream: This is the keystream to apply, positioned at the start of the data.
+    :param int chunk_size: This is the size (in bytes) of each chunk. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate and apply the pad. Defaults to 1.
+    :param progress: This is where the progress is reported after every chunk. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes written.
+    :rtype: int
+    """
+    if workers > 1:
+        return _apply_keystream_parallel(source, destination, keystream, chunk_size, workers, progress)
+    keystream.progress = progress
+    buffer = numpy.empty(chunk_size, dtype=numpy.uint8)
+    view = memoryview(buffer)  # The buffer is reused for every chunk, so the loop does not allocate any data.
+    total = 0
+    while True:
+        start = time.perf_counter()
+        size = _readinto(source, view)
+        if not size:
+            break
+        read_end = time.perf_counter()
+        keystream.apply(buffer[:size])
+        write_start = time.perf_counter()
+        destination.write(view[:size])
+        total += size
+        if progress is not None:
+            progress.advance(size, read=read_end - start, write=time.perf_counter() - write_start)
+    if progress is not None:
+        progress.finish()
+    return total
+
+
+def _apply_keystream_parallel(source: typing.BinaryIO, destination: typing.BinaryIO, keystream: Keystream,
+                              chunk_size: int, workers: int, progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This does the same as `_apply_keystream`, but each chunk gets its own copy of the keystream and is XORed on a
+    thread pool. NumPy releases the GIL while generating and XORing, so this scales with the number of cores. The
+    results are written in order.
+    :param source: This is the file to read from.
+    :type source: typing.BinaryIO
+    :param destination: This is the file to write to.
+    :type destination: typing.BinaryIO
+    :param Keystream keystream: This is the keystream to apply, positioned at the start of the data.
+    :param int chunk_size: This is the size (in bytes) of each chunk.
+    :param int workers: This is the number of threads to use.
+    :param progress: This is where the progress is reported after every chunk is written. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes written.
+    :rtype: int
+    """
+    def write(future: concurrent.futures.Future, data: memoryview, read_seconds: float) -> None:
+        """
+        This waits for a chunk to be XORed and writes it.
+        :param concurrent.futures.Future future: This is the future of the chunk.
+        :param memoryview data: This is the chunk.
+        :param float read_seconds: This is the time spent reading the chunk.
+        """
+        future.result()
+        start = time.perf_counter()
+        destination.write(data)
+        if progress is not None:
+            progress.advance(len(data), read=read_seconds, write=time.perf_counter() - start)
+
+    def apply_pad(buffer: numpy.ndarray, position: int) -> None:
+        """
+        This is the function that encrypts or decrypts one chunk in place.
+        :param numpy.ndarray buffer: This is the chunk.
+        :param int position: This is the position of the chunk in the keystream.
+        """
+        keystream.split(position).apply(buffer)
+
+    keystream.progress = progress  # The copies made by `split` report to the same Progress.
+    buffers = [numpy.empty(chunk_size, dtype=numpy.uint8) for _ in range(workers * 2)]
+    # The buffers are used in turn, and a buffer is only reused once the chunk in it has been written.
+    start = keystream.position
+    total = 0
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        for index in itertools.cycle(range(len(buffers))):
+            view = memoryview(buffers[index])
+            read_start = time.perf_counter()
+            size = _readinto(source, view)
+            if not size:
+                break
+            pending.append((executor.submit(apply_pad, buffers[index][:size], start + total), view[:size],
+                            time.perf_counter() - read_start))
+            total += size
+            if len(pending) == len(buffers):  # This bounds the memory used by chunks waiting to be written.
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+    keystream.seek(start + total)
+    if progress is not None:
+        progress.finish()
+    return total
+
+
+def _apply_keystream_mapped(source: typing.BinaryIO, destination: typing.BinaryIO,
+                            keystream: Keystream, chunk_size: int = default_buffer_size, workers: int = 1,
+                            progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This does the same as `_apply_keystream`, but the files are memory-mapped one window at a time and the pad is XORed
+    from the source window straight into the destination window. The data is never copied through file buffers, and
+    only one window per worker is mapped at a time.
+    :param source: This is the file to read from.
+    :type source: typing.BinaryIO
+    :param destination: This is the file to write to. It must be opened for reading and writing ('w+b' or 'r+b').
+    :type destination: typing.BinaryIO
+    :param Keystream keystream: This is the keystream to apply, positioned at the start of the data.
+    :param int chunk_size: This is the size (in bytes) of each window. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate and apply the pad. Defaults to 1.
+    :param progress: This is where the progress is reported after every window. The files are read and written by
+        page faults while the pad is XORed, so that time is counted as XOR time instead of read and write time.
+        Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes written.
+    :rtype: int
+    """
+    def map_window(file: typing.BinaryIO, position: int, length: int, access: int) -> typing.Tuple[mmap.mmap, int]:
+        """
+        This maps part of a file. Maps have to start on a multiple of the allocation granularity, so the map can start
+        a little before the position.
+        :param file: This is the file to map.
+        :type file: typing.BinaryIO
+        :param int position: This is the position of the window in the file.
+        :param int length: This is the size of the window.
+        :param int access: This is the access mode of the map.
+        :return: Returns the map and the position of the window in it.
+        :rtype: tuple
+        """
+        offset = position - position % mmap.ALLOCATIONGRANULARITY
+        window_map = mmap.mmap(file.fileno(), position + length - offset, access=access, offset=offset)
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):  # This is not available on Windows or before Python 3.8.
+            window_map.madvise(mmap.MADV_SEQUENTIAL)
+        return window_map, position - offset
+
+    def apply_pad(window: int, window_keystream: Keystream) -> None:
+        """
+        This is the function that encrypts or decrypts one window.
+        :param int window: This is the position of the window in the data.
+        :param Keystream window_keystream: This is the keystream, positioned at the start of the window.
+        """
+        length = min(chunk_size, size - window)
+        source_map, source_offset = map_window(source, source_start + window, length, mmap.ACCESS_READ)
+        destination_map, destination_offset = map_window(destination, destination_start + window, length,
+                                                         mmap.ACCESS_WRITE)
+        data = out = None
+        try:
+            data = numpy.frombuffer(source_map, dtype=numpy.uint8, count=length, offset=source_offset)
+            out = numpy.frombuffer(destination_map, dtype=numpy.uint8, count=length, offset=destination_offset)
+            window_keystream.apply(data, out)
+        except BaseException:
+            data = out = None
+            for window_map in (source_map, destination_map):
+                try:
+                    window_map.close()
+                except BufferError:  # The traceback can still point into the map. It is closed when that is freed.
+                    pass
+            raise
+        else:
+            del data, out  # The maps cannot be closed while arrays still point into them.
+            source_map.close()
+            destination_map.close()
+
+    source.flush()
+    source_start = source.tell()
+    size = os.fstat(source.fileno()).st_size - source_start
+    destination.flush()
+    destination_start = destination.tell()
+    destination.truncate(destination_start + size)  # The destination is sized up front so it can be mapped.
+    keystream.progress = progress
+    start = keystream.position
+    windows = range(0, size, chunk_size)
+    if workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(apply_pad, window, keystream.split(start + window)) for window in windows]
+            for window, future in zip(windows, futures):
+                future.result()
+                if progress is not None:
+                    progress.advance(min(chunk_size, size - window))
+        keystream.seek(start + size)
+    else:
+        for window in windows:
+            apply_pad(window, keystream)
+            if progress is not None:
+                progress.advance(min(chunk_size, size - window))
+    source.seek(source_start + size)
+    destination.seek(destination_start + size)
+    if progress is not None:
+        progress.finish()
+    return size
+
+
+def _block_options(options: typing.Dict[str, str]) -> typing.Tuple[int, typing.Union[tuple, None]]:
+    """
+    This checks the format options of a version 3 file.
+    :param dict options: These are the options from the header.
+    :return: Returns the block size, and the functions from `_codec` if the blocks are compressed (or None).
+    :rtype: tuple
+    :raises ValueError: If the options are not supported.
+    :raises ImportError: If the blocks are compressed with zstd and it is not installed.
+    """
+    if options.get('tag') != 'blake2b' or not options.get('block', '').isdigit() or not int(options['block']):
+        raise ValueError('Format options are not supported.')
+    block_size = int(options['block'])
+    if 'compress' not in options:
+        return block_size, None
+    if options['compress'] not in compressions or block_size >= last_block_flag:
+        raise ValueError('Format options are not supported.')
+    return block_size, _codec(options['compress'])
+
+
+def _format_options(compression: typing.Union[str, None] = None) -> typing.Dict[str, typing.Any]:
+    """
+    This makes the format options of a new version 3 file.
+    :param compression: This is the compression of the blocks, one of `compressions`. Defaults to None.
+    :type compression: str or None
+    :return: Returns the options to pass to `_build_header`.
+    :rtype: dict
+    :raises ValueError: If the compression is not supported.
+    """
+    options = {'block': default_block_size, 'tag': 'blake2b'}
+    if compression is not None:
+        if compression not in compressions:
+            raise ValueError('Compression {name} is not supported. Use one of: {names}.'.format(
+                name=compression, names=', '.join(compressions)))
+        options['compress'] = compression
+    return options
+
+
+@functools.lru_cache(maxsize=None)
+def _codec(name: str) -> typing.Tuple[typing.Callable[[memoryview], bytes], typing.Callable[[bytearray], bytes]]:
+    """
+    This imports a compression module the first time it is needed. Fast levels are used, because the point is to read
+    and write less, not to make the smallest files. All of these modules release the GIL, so blocks can be compressed
+    on many threads.
+    :param str name: This is the name of the compression, one of `compressions`.
+    :return: Returns the function that compresses a block and the one that decompresses it.
+    :rtype: tuple
+    :raises ImportError: If zstd is asked for and neither Python 3.14 nor the zstandard module is installed.
+    """
+    if name == 'zlib':
+        import zlib
+
+        return functools.partial(zlib.compress, level=1), zlib.decompress
+    if name == 'lzma':
+        import lzma
+
+        return functools.partial(lzma.compress, preset=0), lzma.decompress
+    try:
+        from compression import zstd  # For Python 3.14 and above
+    except ImportError:
+        try:
+            import zstandard  # https://pypi.org/project/zstandard/
+        except ImportError:
+            raise ImportError('zstd needs Python 3.14 or the zstandard module (pip install zstandard).')
+
+        def compress(block: memoryview) -> bytes:
+            return zstandard.ZstdCompressor(level=3).compress(block)  # Compressors cannot be shared by threads.
+
+        def decompress(block: bytearray) -> bytes:
+            return zstandard.ZstdDecompressor().decompress(block)
+
+        return compress, decompress
+    return functools.partial(zstd.compress, level=3), zstd.decompress
+
+
+def _tagger(password: str, decryption_key: str,
+            options: typing.Dict[str, typing.Any]) -> typing.Callable[[int, bool, memoryview], bytes]:
+    """
+    This makes the function that tags the blocks of a version 3 file. A tag is a keyed BLAKE2b hash of the number of
+    the block, whether it is the last block, and the encrypted block (after its size and flags, if it is compressed).
+    The key is a hash of the password and the whole header, so a wrong password fails on the first block checked,
+    blocks cannot be changed, moved or dropped without failing, and neither can the format options (such as the
+    compression) in the header.
+    :param str password: This is the password used to encrypt the file.
+    :param str decryption_key: This is the decryption key stored in the file header.
+    :param dict options: These are the format options stored in the file header.
+    :return: Returns the function, which takes the number of the block, whether it is the last one and the pieces of
+        the block.
+    :rtype: typing.Callable
+    """
+    import hashlib
+
+    secret = password.encode()
+    key = hashlib.blake2b(struct.pack('<Q', len(secret)) + secret + _build_header(decryption_key, options),
+                          digest_size=32, person=b'MOTP tag key').digest()
+    # The length of the password is hashed too, so no part of the password can be moved into the header.
+
+    def tag(number: int, last: bool, *pieces: memoryview) -> bytes:
+        block_hash = hashlib.blake2b(struct.pack('<Q?', number, last), digest_size=tag_size, key=key)
+        for piece in pieces:  # hashlib releases the GIL for large blocks, so blocks can be tagged on many threads.
+            block_hash.update(piece)
+        return block_hash.digest()
+
+    return tag
+
+
+def _block_error(number: int) -> ValueError:
+    """
+    This makes the error raised when a block fails its check.
+    :param int number: This is the number of the block.
+    :return: Returns the error.
+    :rtype: ValueError
+    """
+    return ValueError('Block {number} failed its check. The password is wrong or the data is corrupted.'.format(
+        number=number))
+
+
+def _check_block(tag: typing.Callable[[int, bool, memoryview], bytes], number: int,
+                 record: typing.Union[bytes, memoryview], block_size: int) -> memoryview:
+    """
+    This checks a block of an uncompressed version 3 file against its tag.
+    :param tag: This is the function from `_tagger`.
+    :type tag: typing.Callable
+    :param int number: This is the number of the block.
+    :param record: This is the tag followed by the encrypted block. A record shorter than a full one is the last one.
+    :type record: bytes or memoryview
+    :param int block_size: This is the block size of the file.
+    :return: Returns the encrypted block.
+    :rtype: memoryview
+    :raises ValueError: If the block fails its check.
+    """
+    import hmac
+
+    record = memoryview(record)
+    if len(record) < tag_size or not hmac.compare_digest(
+            record[:tag_size], tag(number, len(record) < tag_size + block_size, record[tag_size:])):
+        raise _block_error(number)
+    return record[tag_size:]
+
+
+def _seal_block(tag: typing.Callable[[int, bool, memoryview], bytes], compress: typing.Callable[[memoryview], bytes],
+                keystream: Keystream, number: int, block: memoryview, block_size: int, position: int,
+                progress: typing.Union[Progress, None] = None) -> typing.List[typing.Union[bytes, memoryview]]:
+    """
+    This compresses, encrypts and tags a block of a compressed version 3 file. A block that does not shrink is stored
+    as it is, so no stored block is larger than a full block, and the pad of each block starts at its number times the
+    block size without overlapping the next one.
+    :param tag: This is the function from `_tagger`.
+    :type tag: typing.Callable
+    :param compress: This is the compression function from `_codec`.
+    :type compress: typing.Callable
+    :param Keystream keystream: This is the keystream. It is moved to position first if it is not already there.
+    :param int number: This is the number of the block.
+    :param memoryview block: This is the block. Only the last block is shorter than a full block.
+    :param int block_size: This is the block size of the file.
+    :param int position: This is the position of the pad of the block.
+    :param progress: This is where the time spent compressing and tagging is recorded. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the pieces of the record: the size, flags and tag, then the encrypted block.
+    :rtype: list
+    """
+    start = time.perf_counter()
+    compressed = compress(block)
+    compress_seconds = time.perf_counter() - start
+    flags = last_block_flag if len(block) < block_size else 0
+    if len(compressed) >= len(block):
+        compressed, flags = block, flags | raw_block_flag
+    stored = numpy.empty(len(compressed), dtype=numpy.uint8)
+    if keystream.position != position:
+        keystream.seek(position)
+    keystream.apply(numpy.frombuffer(compressed, dtype=numpy.uint8), stored)
+    prefix = record_prefix.pack(len(stored) | flags)
+    start = time.perf_counter()
+    block_tag = tag(number, bool(flags & last_block_flag), prefix, stored)
+    if progress is not None:
+        progress.record(compress=compress_seconds, tag=time.perf_counter() - start)
+    return [prefix + block_tag, memoryview(stored)]
+
+
+def _block_index(tag: typing.Callable[[int, bool, memoryview], bytes], prefixes: typing.List[bytes]) -> bytes:
+    """
+    This makes the index stored after the last block of a compressed version 3 file: the size and flags stored before
+    every block, their tag and the number of blocks. It lets `DecryptedFile` find where every block starts without
+    reading the whole file. The tag is made like a block tag for the number after the last block.
+    :param tag: This is the function from `_tagger`.
+    :type tag: typing.Callable
+    :param list prefixes: These are the sizes and flags stored before every block, in order.
+    :return: Returns the index.
+    :rtype: bytes
+    """
+    table = b''.join(prefixes)
+    return table + tag(len(prefixes), True, b'MOTP index', table) + block_index_footer.pack(len(prefixes))
+
+
+def _open_block(tag: typing.Callable[[int, bool, memoryview], bytes], decompress: typing.Callable[[bytearray], bytes],
+                keystream: typing.Union[Keystream, None], number: int, header: bytes, stored: bytearray,
+                block_size: int, position: int,
+                progress: typing.Union[Progress, None] = None) -> typing.Union[bytes, bytearray, None]:
+    """
+    This checks, decrypts and decompresses a block of a compressed version 3 file.
+    :param tag: This is the function from `_tagger`.
+    :type tag: typing.Callable
+    :param decompress: This is the decompression function from `_codec`.
+    :type decompress: typing.Callable
+    :param keystream: This is the keystream. It is moved to position first if it is not already there. If None is
+        given, the block is only checked.
+    :type keystream: Keystream or None
+    :param int number: This is the number of the block.
+    :param bytes header: This is the start of the record: the size, flags and tag.
+    :param bytearray stored: This is the encrypted block. It is decrypted in place.
+    :param int block_size: This is the block size of the file.
+    :param int position: This is the position of the pad of the block.
+    :param progress: This is where the time spent checking and decompressing is recorded. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the block, or None if no keystream is given.
+    :rtype: bytes or bytearray or None
+    :raises ValueError: If the block fails its check.
+    """
+    import hmac
+
+    start = time.perf_counter()
+    flags = record_prefix.unpack_from(header)[0]
+    last = bool(flags & last_block_flag)
+    checked = hmac.compare_digest(header[record_prefix.size:],
+                                  tag(number, last, header[:record_prefix.size], stored))
+    tag_seconds = time.perf_counter() - start
+    if not checked:
+        raise _block_error(number)
+    block = None
+    compress_seconds = 0.0
+    if keystream is not None:
+        if keystream.position != position:
+            keystream.seek(position)
+        keystream.apply(numpy.frombuffer(stored, dtype=numpy.uint8))
+        start = time.perf_counter()
+        try:
+            block = stored if flags & raw_block_flag else decompress(stored)
+        except Exception:  # Each compression module has its own errors.
+            raise _block_error(number)
+        compress_seconds = time.perf_counter() - start
+        if (len(block) < block_size) != last or len(block) > block_size:  # Only the last block is short.
+            raise _block_error(number)
+    if progress is not None:
+        progress.record(compress=compress_seconds, tag=tag_seconds)
+    return block
+
+
+def _apply_blocks(source: typing.BinaryIO, destination: typing.Union[typing.BinaryIO, None],
+                  keystream: typing.Union[Keystream, None], tag: typing.Callable[[int, bool, memoryview], bytes],
+                  block_size: int, encrypting: bool, chunk_size: int = default_buffer_size, workers: int = 1,
+                  progress: typing.Union[Progress, None] = None, codec: typing.Union[tuple, None] = None) -> int:
+    """
+    This does the same as `_apply_keystream` for the block format of version 3 files, where every block is stored after
+    its tag. When encrypting, the blocks are XORed and tagged. When decrypting, every block is checked before it is
+    XORed, so nothing is written from a block that fails. The last block is always shorter than a full block (it is
+    empty if the data ends on a block boundary), so data that is cut off is caught too. The first chunk is a single
+    block, so a wrong password is caught before anything else is read. The other chunks are made of whole blocks, are
+    processed on a thread pool when more than one worker is used, and are written in order.
+    :param source: This is the file to read from.
+    :type source: typing.BinaryIO
+    :param destination: This is the file to write to. If None is given, nothing is written.
+    :type destination: typing.BinaryIO or None
+    :param keystream: This is the keystream to apply, positioned at the start of the data. If None is given, the blocks
+        are only checked.
+    :type keystream: Keystream or None
+    :param tag: This is the function from `_tagger`.
+    :type tag: typing.Callable
+    :param int block_size: This is the block size of the file.
+    :param bool encrypting: If this is set to True, the data is encrypted. Otherwise, it is checked and decrypted.
+    :param int chunk_size: This is the size (in bytes) of each chunk. It is rounded down to whole blocks. Defaults to
+        `default_buffer_size`.
+    :param int workers: This is the number of threads used. Defaults to 1.
+    :param progress: This is where the progress is reported after every chunk. The time spent tagging or checking the
+        blocks is counted as 'tag'. Defaults to None.
+    :type progress: Progress or None
+    :param codec: These are the functions from `_codec` if the blocks are compressed, as with `_seal_block` and
+        `_open_block`. Compressed records have different sizes, so they are read one at a time, and the last one is
+        followed by the index from `_block_index`. Defaults to None.
+    :type codec: tuple or None
+    :return: Returns the number of bytes of data (without the tags, before compression).
+    :rtype: int
+    :raises ValueError: If a block fails its check, the data is cut off, or the block index of compressed blocks fails
+        its check.
+    """
+    import hmac
+
+    def read_chunks() -> typing.Iterator[typing.Tuple[typing.Any, int, float]]:
+        """
+        This reads the chunks. A chunk is a buffer and the size of the data in it, or a list of records (the start of
+        each record and its encrypted block) when compressed blocks are decrypted. An empty chunk is added for the
+        empty last block when the data to encrypt ends on a block boundary.
+        :return: Yields every chunk, the number of blocks in it and the time spent reading it.
+        :rtype: typing.Iterator
+        :raises ValueError: If the data to decrypt is cut off.
+        """
+        if codec is not None and not encrypting:
+            header_size = record_prefix.size + tag_size
+            records = []
+            limit = 1
+            start = time.perf_counter()
+            while True:
+                header = bytearray(header_size)
+                if _readinto_full(source, memoryview(header)) < header_size:
+                    raise ValueError('Data is cut off.')
+                flags = record_prefix.unpack_from(header)[0]
+                if flags & (last_block_flag - 1) > block_size:
+                    raise _block_error(number + len(records))
+                stored = bytearray(flags & (last_block_flag - 1))
+                if _readinto_full(source, memoryview(stored)) < len(stored):
+                    raise ValueError('Data is cut off.')
+                records.append((bytes(header), stored))
+                prefixes.append(bytes(header[:record_prefix.size]))
+                if flags & last_block_flag or len(records) == limit:
+                    yield records, len(records), time.perf_counter() - start
+                    records = []
+                    limit = max(chunk_size // block_size, 1)
+                    start = time.perf_counter()
+                if flags & last_block_flag:
+                    index = _block_index(tag, prefixes)
+                    stored_index = bytearray(len(index) + 1)
+                    # One more byte is read, so data after the index is caught.
+                    stored_size = _readinto_full(source, memoryview(stored_index))
+                    if stored_size < len(index):
+                        raise ValueError('Data is cut off.')
+                    if stored_size > len(index):
+                        raise ValueError('Data continues after the last block.')
+                    if not hmac.compare_digest(stored_index[:len(index)], index):
+                        raise ValueError('The block index failed its check. The data is corrupted.')
+                    return
+        unit = block_size if encrypting else tag_size + block_size
+        read_size = max(chunk_size // unit, 1) * unit
+        buffers = [numpy.empty(read_size, dtype=numpy.uint8) for _ in range(queue_size)]
+        # The buffers are used in turn, and a buffer is only reused once the chunk in it has been written.
+        size = wanted = unit
+        for buffer in itertools.cycle(buffers):
+            start = time.perf_counter()
+            size = _readinto_full(source, memoryview(buffer)[:wanted])
+            if not size:
+                break
+            yield (buffer, size), -(-size // unit), time.perf_counter() - start
+            if size < wanted:
+                break
+            wanted = read_size
+        if size % unit:
+            return
+        if not encrypting:
+            raise ValueError('Data is cut off.')
+        yield (buffers[0][:0], 0), 1, 0.0  # This is the empty last block.
+
+    def process(chunk: typing.Any, number: int,
+                chunk_keystream: typing.Union[Keystream, None]) -> typing.Tuple[list, int]:
+        """
+        This encrypts and tags, or checks and decrypts, one chunk. Uncompressed blocks are processed in place.
+        :param chunk: This is a chunk from `read_chunks`.
+        :param int number: This is the number of the first block in the chunk.
+        :param chunk_keystream: This is the keystream, positioned at the start of the chunk.
+        :type chunk_keystream: Keystream or None
+        :return: Returns the pieces to write, in order, and the size of the data in them (without the tags).
+        :rtype: tuple
+        """
+        pieces = []
+        data_size = 0
+        if codec is not None and encrypting:
+            buffer, data_size = chunk
+            view = memoryview(buffer)
+            for offset in range(0, max(data_size, 1), block_size):
+                block_number = number + offset // block_size
+                pieces.extend(_seal_block(tag, codec[0], chunk_keystream, block_number,
+                                          view[offset:min(offset + block_size, data_size)], block_size,
+                                          start_position + block_number * block_size, progress))
+            return pieces, data_size
+        if codec is not None:
+            for index, (header, stored) in enumerate(chunk):
+                block = _open_block(tag, codec[1], chunk_keystream, number + index, header, stored, block_size,
+                                    start_position + (number + index) * block_size, progress)
+                if block is not None:
+                    pieces.append(block)
+                    data_size += len(block)
+            return pieces, data_size
+        buffer, size = chunk
+        view = memoryview(buffer)
+        tag_seconds = 0.0
+        if encrypting:
+            chunk_keystream.apply(buffer[:size])
+            start = time.perf_counter()
+            for offset in range(0, max(size, 1), block_size):
+                block = view[offset:min(offset + block_size, size)]
+                pieces.extend((tag(number + offset // block_size, len(block) < block_size, block), block))
+            tag_seconds = time.perf_counter() - start
+            data_size = size
+        else:
+            record_size = tag_size + block_size
+            for offset in range(0, size, record_size):
+                start = time.perf_counter()
+                block = _check_block(tag, number + offset // record_size, view[offset:min(offset + record_size, size)],
+                                     block_size)
+                tag_seconds += time.perf_counter() - start
+                if chunk_keystream is not None:
+                    chunk_keystream.apply(buffer[offset + tag_size:offset + tag_size + len(block)])
+                pieces.append(block)
+                data_size += len(block)
+        if progress is not None:
+            progress.record(tag=tag_seconds)
+        return pieces, data_size
+
+    def write(pieces: typing.List[typing.Union[bytes, memoryview]], size: int, read_seconds: float) -> int:
+        """
+        This writes the pieces of a chunk.
+        :param list pieces: These are the pieces.
+        :param int size: This is the size of the data in the chunk, without the tags.
+        :param float read_seconds: This is the time spent reading the chunk.
+        :return: Returns the size.
+        :rtype: int
+        """
+        start = time.perf_counter()
+        if codec is not None and encrypting:
+            prefixes.extend(bytes(piece[:record_prefix.size]) for piece in pieces[::2])
+            # Every record is the size, flags and tag, then the encrypted block.
+        if destination is not None:
+            for piece in pieces:
+                destination.write(piece)
+        if progress is not None:
+            progress.advance(size, read=read_seconds, write=time.perf_counter() - start)
+        return size
+
+    if keystream is not None:
+        keystream.progress = progress  # The copies made by `split` report to the same Progress.
+    start_position = keystream.position if keystream is not None else 0
+    queue_size = workers * 2 if workers > 1 else 1
+    total = 0
+    number = 0
+    prefixes = []  # These are the sizes and flags stored before compressed blocks, for `_block_index`.
+    pending = collections.deque()
+    executor = concurrent.futures.ThreadPoolExecutor(workers) if workers > 1 else None
+    try:
+        for chunk, blocks, read_seconds in read_chunks():
+            if executor is None or not number:
+                total += write(*process(chunk, number, keystream), read_seconds)
+            else:
+                chunk_keystream = None if keystream is None else keystream.split(start_position + number * block_size)
+                pending.append((executor.submit(process, chunk, number, chunk_keystream), read_seconds))
+                if len(pending) == queue_size:  # This bounds the memory used by chunks waiting to be written.
+                    future, read_seconds = pending.popleft()
+                    total += write(*future.result(), read_seconds)
+            number += blocks
+        while pending:
+            future, read_seconds = pending.popleft()
+            total += write(*future.result(), read_seconds)
+        if codec is not None and encrypting:
+            destination.write(_block_index(tag, prefixes))
+    finally:
+        if executor is not None:
+            for future, _ in pending:
+                future.cancel()  # This stops as soon as a block fails.
+            executor.shutdown()
+    if keystream is not None and executor is not None and codec is None:
+        keystream.seek(start_position + total)
+    if progress is not None:
+        progress.finish()
+    return total
+
+
+def _apply_keystream_in_place(file: typing.BinaryIO, journal: typing.BinaryIO, keystream: Keystream, size: int,
+                              shift: int, chunk_size: int, encrypting: bool,
+                              progress: typing.Union[Progress, None] = None, offset: int = 0) -> None:
+    """
+    This XORs a file with the keystream in its own blocks, moving the data by the length of the header at the same
+    time: towards the end when encrypting (processing the chunks from the last one) and towards the start when
+    decrypting. Before a chunk is overwritten, a copy of it is synced to the journal, so if the job is interrupted, the
+    last chunk can be redone from its copy and the job can carry on from the next one. The journal has two slots for
+    copies, used in turn, so the newest complete copy is never overwritten.
+    :param file: This is the file, opened with 'r+b'.
+    :type file: typing.BinaryIO
+    :param journal: This is the journal, opened with 'r+b'.
+    :type journal: typing.BinaryIO
+    :param Keystream keystream: This is the keystream of the file.
+    :param int size: This is the size (in bytes) of the data, without the header.
+    :param int shift: This is the length of the header.
+    :param int chunk_size: This is the size (in bytes) of each chunk.
+    :param bool encrypting: If this is set to True, the data is moved towards the end. Otherwise, towards the start.
+    :param progress: This is where the progress is reported after every chunk. Defaults to None.
+    :type progress: Progress or None
+    :param int offset: This is added to every position in the file, so data after a header can be changed without
+        being moved (with a shift of 0). Defaults to 0.
+    """
+    import zlib
+
+    def sync(synced_file: typing.BinaryIO) -> None:
+        synced_file.flush()
+        getattr(os, 'fdatasync', os.fsync)(synced_file.fileno())  # fdatasync is not available on Windows or macOS.
+
+    def apply_pad(position: int, length: int) -> None:
+        """
+        This XORs the chunk in the buffer and writes it to its new place.
+        :param int position: This is the position of the chunk in the data.
+        :param int length: This is the size of the chunk.
+        """
+        if keystream.position != position:
+            keystream.seek(position)
+        keystream.apply(buffer[:length])
+        file.seek(offset + position + destination_shift)
+        file.write(view[:length])
+        sync(file)
+
+    keystream.progress = progress
+    positions = range(0, size, chunk_size)
+    if encrypting:
+        positions = positions[::-1]  # The data moves towards the end, so the last chunk has to be moved first.
+    source_shift, destination_shift = (0, shift) if encrypting else (shift, 0)
+    buffer = numpy.empty(chunk_size, dtype=numpy.uint8)
+    view = memoryview(buffer)
+    slot_size = journal_slot.size + chunk_size
+    newest = 0
+    for slot in range(2):  # This finds the newest complete copy left by an interrupted job.
+        journal.seek(journal_line_size + slot * slot_size)
+        header = journal.read(journal_slot.size)
+        if len(header) < journal_slot.size:
+            continue
+        number, length, checksum = journal_slot.unpack(header)
+        data = journal.read(length) if length <= chunk_size else b''
+        if newest < number <= len(positions) and len(data) == length and \
+                zlib.crc32(data, zlib.crc32(header[:-4])) == checksum:
+            newest = number
+            buffer[:length] = numpy.frombuffer(data, dtype=numpy.uint8)
+    if newest:
+        length = min(chunk_size, size - positions[newest - 1])
+        apply_pad(positions[newest - 1], length)  # The copy is of the chunk before it was XORed, so this can be redone.
+        if progress is not None:
+            progress.advance(sum(min(chunk_size, size - position) for position in positions[:newest]))
+    for number, position in enumerate(positions[newest:], newest + 1):
+        start = time.perf_counter()
+        length = min(chunk_size, size - position)
+        file.seek(offset + position + source_shift)
+        _readinto(file, view[:length])
+        read_end = time.perf_counter()
+        checksum = zlib.crc32(view[:length], zlib.crc32(journal_slot.pack(number, length, 0)[:-4]))
+        # The checksum covers the number and the size too, so a copy that was only partly written is never used.
+        journal.seek(journal_line_size + number % 2 * slot_size)
+        journal.write(journal_slot.pack(number, length, checksum))
+        journal.write(view[:length])
+        sync(journal)
+        write_start = time.perf_counter()
+        apply_pad(position, length)
+        if progress is not None:
+            progress.advance(length, read=read_end - start, write=time.perf_counter() - write_start)
+    if progress is not None:
+        progress.finish()
+
+
+def _run_in_place(source_path: str, destination_path: str, encrypting: bool, password: str, buffer_size: int,
+                  decryption_key: typing.Union[str, None] = None,
+                  progress: typing.Union[Progress, None] = None) -> str:
+    """
+    This encrypts or decrypts a file in its own blocks and renames it, or resumes a job that was interrupted. The
+    result is the same as that of `_encrypt_file` or `_decrypt_file`, but the disk space used only grows by the
+    header and a journal of two chunks. The journal is named after the encrypted file, with '.journal' added.
+    :param str source_path: This is the path of the file.
+    :param str destination_path: This is the path the file is renamed to once it is done.
+    :param bool encrypting: If this is set to True, the file is encrypted. Otherwise, it is decrypted.
+    :param str password: This is the password used to encrypt the file.
+    :param int buffer_size: This is the size (in bytes) of each chunk. It is kept in the journal, so a resumed job
+        uses the same size.
+    :param decryption_key: This is the decryption key to store when encrypting. If none is provided, a random one is
+        generated. Defaults to None.
+    :type decryption_key: str or None
+    :param progress: This is where the progress is reported. Its total is set to the size of the data if it has none.
+        Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the path of the new file.
+    :rtype: str
+    :raises FileExistsError: If the destination file already exists.
+    :raises ValueError: If the file is not a version 2 file, its decryption key is invalid or destroyed, the journal
+        belongs to another operation, or the file to encrypt is itself a journal or temporary file.
+    """
+    if encrypting and source_path.endswith(sidecar_extensions):
+        raise ValueError('File {path} belongs to an interrupted job and cannot be encrypted.'.format(path=source_path))
+    operation = 'encrypt' if encrypting else 'decrypt'
+    journal_path = (destination_path if encrypting else source_path) + '.journal'
+    if os.path.exists(journal_path):
+        with open(journal_path, 'rb') as journal:
+            fields = journal.read(journal_line_size).decode(errors='replace').split()
+        if len(fields) != 6 or fields[0] != 'MOTP-journal' or fields[1] != operation:
+            raise ValueError('Journal {path} does not belong to this operation.'.format(path=journal_path))
+        decryption_key = fields[2]
+        size, chunk_size, shift = (int(field) for field in fields[3:])
+        if not os.path.exists(source_path) and os.path.exists(destination_path):
+            os.remove(journal_path)  # The job was interrupted after the file was renamed.
+            return destination_path
+    else:
+        if os.path.exists(destination_path):
+            raise FileExistsError('File {path} already exists.'.format(path=destination_path))
+        if encrypting:
+            if decryption_key is None:
+                decryption_key = str(numpy.random.default_rng().random())  # This generates a random decryption key.
+            size = os.path.getsize(source_path)
+            shift = len(_build_header(decryption_key))
+        else:
+            with open(source_path, 'rb') as encrypted_file:
+                version, decryption_key, _ = _read_header(encrypted_file)
+                shift = encrypted_file.tell()
+            if version != 2:
+                raise ValueError('Only version 2 files can be decrypted in place.')
+            try:
+                float(decryption_key)
+            except ValueError:
+                raise ValueError('Decryption key is invalid or destroyed.')
+            size = os.path.getsize(source_path) - shift
+        chunk_size = min(buffer_size, max(size, 1))
+        # Small files do not need a full-sized buffer.
+        with open(journal_path, 'wb') as journal:
+            journal.write('MOTP-journal {operation} {key} {size} {chunk_size} {shift}\n'.format(
+                operation=operation, key=decryption_key, size=size, chunk_size=chunk_size,
+                shift=shift).encode().ljust(journal_line_size))
+            journal.flush()
+            os.fsync(journal.fileno())
+    if progress is not None and progress.total is None:
+        progress.total = size
+    with open(source_path, 'r+b') as file, open(journal_path, 'r+b') as journal:
+        if encrypting:
+            file.truncate(size + shift)  # This makes room for the header.
+        _apply_keystream_in_place(file, journal, Keystream(password, decryption_key), size, shift, chunk_size,
+                                  encrypting, progress)
+        if encrypting:
+            file.seek(0)
+            file.write(_build_header(decryption_key))  # The header is written once the data has been moved out of it.
+        else:
+            file.truncate(size)
+        file.flush()
+        os.fsync(file.fileno())
+    os.rename(source_path, destination_path)
+    os.remove(journal_path)  # This is removed last, so a job interrupted before the rename is resumed.
+    return destination_path
+
+
+def _rekey_in_place(file_path: str, old_password: str, new_password: str, buffer_size: int,
+                    progress: typing.Union[Progress, None] = None) -> str:
+    """
+    This changes the password of a version 2 file in its own blocks, or resumes a change that was interrupted. Both
+    decryption keys are synced to a journal (named like the ones of `_run_in_place`) before any data is changed, and
+    each chunk is copied to it before it is overwritten. The new header is written last. Running it again after an
+    interruption takes the keys from the journal and finishes the job, whatever state the file was left in.
+    :param str file_path: This is the path of the encrypted file.
+    :param str old_password: This is the password the file is encrypted with.
+    :param str new_password: This is the new password.
+    :param int buffer_size: This is the size (in bytes) of each chunk. It is kept in the journal, so a resumed job
+        uses the same size.
+    :param progress: This is where the progress is reported. Its total is set to the size of the data if it has none.
+        Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the path of the file.
+    :rtype: str
+    :raises ValueError: If the file is not a version 2 file, its decryption key is invalid or destroyed, its header
+        cannot be rewritten in place, or the journal belongs to another operation.
+    """
+    journal_path = file_path + '.journal'
+    if os.path.exists(journal_path):
+        with open(journal_path, 'rb') as journal:
+            fields = journal.read(journal_line_size).decode(errors='replace').split()
+        if len(fields) != 7 or fields[0] != 'MOTP-journal' or fields[1] != 'rekey':
+            raise ValueError('Journal {path} does not belong to this operation.'.format(path=journal_path))
+        old_key, decryption_key = fields[2:4]
+        size, chunk_size, shift = (int(field) for field in fields[4:])
+    else:
+        with open(file_path, 'rb') as encrypted_file:
+            version, old_key, options = _read_header(encrypted_file)
+            shift = encrypted_file.tell()
+        _stream_keystream((version, old_key, options), old_password)  # This checks the version and the key.
+        decryption_key = str(numpy.random.default_rng().random())  # This generates a random decryption key.
+        if shift != len(_build_header(decryption_key)):
+            raise ValueError('The header of this file cannot be rewritten in place.')
+        size = os.path.getsize(file_path) - shift
+        chunk_size = min(buffer_size, max(size, 1))
+        # Small files do not need a full-sized buffer.
+        with open(journal_path, 'wb') as journal:
+            journal.write('MOTP-journal rekey {old_key} {key} {size} {chunk_size} {shift}\n'.format(
+                old_key=old_key, key=decryption_key, size=size, chunk_size=chunk_size,
+                shift=shift).encode().ljust(journal_line_size))
+            journal.flush()
+            os.fsync(journal.fileno())
+    if progress is not None and progress.total is None:
+        progress.total = size
+    keystream = KeystreamPair(Keystream(old_password, old_key), Keystream(new_password, decryption_key))
+    with open(file_path, 'r+b') as file, open(journal_path, 'r+b') as journal:
+        _apply_keystream_in_place(file, journal, keystream, size, 0, chunk_size, False, progress, shift)
+        file.seek(0)
+        file.write(_build_header(decryption_key))  # The header is written last, once the data matches it.
+        file.flush()
+        os.fsync(file.fileno())
+    os.remove(journal_path)  # This is removed last, so a job interrupted before the header is synced is resumed.
+    return file_path
+
+
+def _encrypt_file(file_path: str, password: str, buffer_size: int = default_buffer_size, workers: int = 1,
+                  memory_map: bool = False, in_place: bool = False, integrity: bool = False,
+                  decryption_key: typing.Union[str, None] = None, progress: typing.Union[Progress, None] = None,
+                  compression: typing.Union[str, None] = None) -> str:
+    """
+    This encrypts a file and removes the original, without any prompts or output.
+    :param str file_path: This is the path of the file to encrypt.
+    :param str password: This is the password used to encrypt the file.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream the file. Defaults to
+        `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad. Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped. Defaults to False.
+    :param bool in_place: If this is set to True, the file is encrypted in its own blocks and renamed, so only the
+        header and a journal of two buffers are needed on disk. If the job is interrupted, running it again resumes it.
+        workers and memory_map are not used. Defaults to False.
+    :param bool integrity: If this is set to True, a version 3 file is written, where every block is stored with a tag
+        that `decrypt` and `verify` check, so a wrong password or corrupted data is caught. memory_map is not used.
+        Defaults to False.
+    :param decryption_key: This is the decryption key to store. If none is provided, a random one is generated.
+        Defaults to None.
+    :type decryption_key: str or None
+    :param progress: This is where the progress is reported. Its total is set to the size of the file if it has none.
+        Defaults to None.
+    :type progress: Progress or None
+    :param compression: This is the compression of the blocks, one of `compressions`. If one is given, a version 3
+        file is written as with integrity, and every block is compressed before it is encrypted. Defaults to None.
+    :type compression: str or None
+    :return: Returns the path of the encrypted file.
+    :rtype: str
+    :raises FileExistsError: If the encrypted file already exists.
+    :raises ValueError: If an in-place encryption of the file was interrupted and in_place is not set to True, in_place
+        is combined with integrity or compression, the compression is not supported, or the file is the journal or
+        temporary file of an interrupted job (see `sidecar_extensions`).
+    :raises ImportError: If the compression is zstd and it is not installed.
+    """
+    if file_path.endswith(sidecar_extensions):
+        raise ValueError('File {path} belongs to an interrupted job and cannot be encrypted.'.format(path=file_path))
+    encrypted_file_path = file_path + '.MOTP'
+    integrity = integrity or compression is not None  # Compressed blocks are always tagged.
+    if in_place and integrity:
+        raise ValueError('Files with integrity tags cannot be encrypted in place.')
+    options = _format_options(compression)
+    codec = _codec(compression) if compression is not None else None
+    if in_place:
+        return _run_in_place(file_path, encrypted_file_path, True, password, buffer_size, decryption_key, progress)
+    if os.path.exists(encrypted_file_path + '.journal'):
+        raise ValueError('An in-place encryption of {path} was interrupted. Run it in place again to resume it.'.format(
+            path=file_path))
+    if decryption_key is None:
+        decryption_key = str(numpy.random.default_rng().random())  # This generates a random decryption key.
+    if os.path.exists(encrypted_file_path):
+        raise FileExistsError('File {path} already exists.'.format(path=encrypted_file_path))
+    file_size = os.path.getsize(file_path)
+    if progress is not None and progress.total is None:
+        progress.total = file_size
+    buffer_size = min(buffer_size, max(file_size, 1))
+    # Small files do not need a full-sized buffer.
+    with open(file_path, 'rb') as decrypted_file:
+        with open(encrypted_file_path, 'w+b' if memory_map else 'wb') as encrypted_file:
+            try:
+                keystream = Keystream(password, decryption_key)
+                if integrity:
+                    encrypted_file.write(_build_header(decryption_key, options))
+                    _apply_blocks(decrypted_file, encrypted_file, keystream,
+                                  _tagger(password, decryption_key, options), default_block_size, True, buffer_size,
+                                  workers, progress, codec)
+                else:
+                    encrypted_file.write(_build_header(decryption_key))
+                    # The newline is used to separate the header from the rest of the file.
+                    (_apply_keystream_mapped if memory_map else _apply_keystream)(
+                        decrypted_file, encrypted_file, keystream, buffer_size, workers, progress)
+            except Exception as exception:
+                encrypted_file.close()
+                os.remove(encrypted_file_path)  # This removes the partially encrypted file.
+                raise exception
+    os.remove(file_path)  # This removes the decrypted file.
+    return encrypted_file_path
+
+
+def _decrypt_file(file_path: str, password: str, buffer_size: int = default_buffer_size, workers: int = 1,
+                  memory_map: bool = False, in_place: bool = False,
+                  progress: typing.Union[Progress, None] = None) -> str:
+    """
+    This decrypts a file and removes the encrypted file, without any prompts or output.
+    :param str file_path: This is the path of the file to decrypt. It must end with '.MOTP'.
+    :param str password: This is the password used to encrypt the file.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream the file. Defaults to
+        `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad. Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped. Defaults to False.
+    :param bool in_place: If this is set to True, the file is decrypted in its own blocks and renamed, so only a
+        journal of two buffers is needed on disk. If the job is interrupted, running it again resumes it. Only version
+        2 files can be decrypted in place. workers and memory_map are not used. Defaults to False.
+    :param progress: This is where the progress is reported. Its total is set to the size of the data if it has none,
+        unless the blocks are compressed. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the path of the decrypted file.
+    :rtype: str
+    :raises FileExistsError: If the decrypted file already exists.
+    :raises ValueError: If the file is not a '.MOTP' file, its format version or options are not supported, its
+        decryption key is invalid or destroyed, a block fails its check (version 3 files), or an in-place decryption of
+        it was interrupted and in_place is not set to True.
+    :raises ImportError: If the blocks are compressed with zstd and it is not installed.
+    """
+    def generate_pad(seed, size: int) -> numpy.ndarray:
+        """
+        This generates a pseudorandom pad for the decryption of version 1 files.
+        :param seed: This is the default_rng seed to set the random outcome
+        :type seed: <class 'numpy.random._generator.Generator'>
+        :param int size: This is the size of the pad.
+        :return: Returns a numpy.ndarray of the pad.
+        :rtype: numpy.ndarray
+        """
+        return seed.integers(0, 255, size, dtype=numpy.uint8)
+
+    def apply_pad(data: bytes, pad: numpy.ndarray) -> numpy.ndarray:
+        """
+        This is the function that decrypts the data.
+        :param bytes data: This is the data to decrypt.
+        :param numpy.ndarray pad: This is the pad to decrypt the data with.
+        :return: Returns the decrypted data.
+        :rtype: numpy.ndarray
+        """
+        return bytearray(data) ^ pad
+
+    if not file_path.endswith('.MOTP'):
+        raise ValueError('File {path} is not a .MOTP file.'.format(path=file_path))
+    decrypted_file_path = file_path[:-len('.MOTP')]
+    if in_place:
+        return _run_in_place(file_path, decrypted_file_path, False, password, buffer_size, progress=progress)
+    if os.path.exists(file_path + '.journal'):
+        raise ValueError('An in-place job on {path} was interrupted. Run the same job in place again to resume '
+                         'it.'.format(path=file_path))
+    if os.path.exists(decrypted_file_path):
+        raise FileExistsError('File {path} already exists.'.format(path=decrypted_file_path))
+    buffer_size = min(buffer_size, max(os.path.getsize(file_path), 1))
+    # Small files do not need a full-sized buffer.
+    with open(file_path, 'rb') as encrypted_file:
+        version, decryption_key, options = _read_header(encrypted_file)
+        if not 1 <= version <= format_version:
+            raise ValueError('Format version is not supported.')
+        try:
+            float(decryption_key)
+        except ValueError:
+            raise ValueError('Decryption key is invalid or destroyed.')
+        file_size = os.path.getsize(file_path) - encrypted_file.tell()
+        codec = None
+        if version == 3:
+            block_size, codec = _block_options(options)
+            file_size -= -(-file_size // (tag_size + block_size)) * tag_size  # This leaves out the tags.
+        if progress is not None and progress.total is None and codec is None:
+            # The size of compressed data is only known once it is decompressed.
+            progress.total = file_size
+        with open(decrypted_file_path, 'w+b' if memory_map and version == 2 else 'wb') as decrypted_file:
+            try:
+                if version == 1:
+                    rng = numpy.random.default_rng(
+                        seed=int.from_bytes(bytes((password + decryption_key).encode()), 'big'))
+                    # This sets the random outcome to reverse the encryption.
+                    for _ in range(int(file_size / legacy_chunk_size)):
+                        decrypted_file.write(apply_pad(encrypted_file.read(legacy_chunk_size),
+                                                       generate_pad(rng, legacy_chunk_size)))
+                        if progress is not None:
+                            progress.advance(legacy_chunk_size)
+                    # Version 1 files must be decrypted with the same chunk size they were encrypted with.
+                    excess_size = file_size % legacy_chunk_size
+                    decrypted_file.write(apply_pad(encrypted_file.read(excess_size), generate_pad(rng, excess_size)))
+                    if progress is not None:
+                        progress.advance(excess_size)
+                        progress.finish()  # The stages of version 1 files are not timed.
+                elif version == 3:
+                    _apply_blocks(encrypted_file, decrypted_file, Keystream(password, decryption_key),
+                                  _tagger(password, decryption_key, options), block_size, False, buffer_size, workers,
+                                  progress, codec)
+                    # Every block is checked before it is written, so a wrong password fails before anything is.
+                else:
+                    (_apply_keystream_mapped if memory_map else _apply_keystream)(
+                        encrypted_file, decrypted_file, Keystream(password, decryption_key), buffer_size, workers,
+                        progress)
+            except Exception as exception:
+                decrypted_file.close()
+                os.remove(decrypted_file_path)  # This removes the partially decrypted file.
+                raise exception
+    os.remove(file_path)  # This removes the encrypted file.
+    return decrypted_file_path
+
+
+def _destroy_file(file_path: str) -> str:
+    """
+    This overwrites the decryption key of an encrypted file in place and syncs it to disk, without any prompts or
+    output. Only the key is written, whatever the size of the file. Files with an interrupted in-place job are refused,
+    because the journal of the job keeps the key (and a rekey journal keeps both keys) in plain text.
+    :param str file_path: This is the path of the encrypted file.
+    :return: Returns the path of the file.
+    :rtype: str
+    :raises ValueError: If the decryption key is invalid or already destroyed, or an in-place job on the file was
+        interrupted.
+    """
+    if os.path.exists(file_path + '.journal'):
+        raise ValueError('An in-place job on {path} was interrupted, and its journal keeps the key. Run the same job '
+                         'in place again to finish it first.'.format(path=file_path))
+    with open(file_path, 'r+b') as encrypted_file:
+        version, decryption_key, _ = _read_header(encrypted_file)
+        try:
+            float(decryption_key)
+        except ValueError:
+            raise ValueError('Decryption key is invalid or already destroyed.')
+        encrypted_file.seek(0)
+        line = encrypted_file.readline()
+        position = line.index(decryption_key.encode(), 0 if version == 1 else line.index(b' '))
+        padding = line[position + len(decryption_key):]
+        slot_size = len(decryption_key) + len(padding) - len(padding.lstrip(b' ')) - (1 if padding.strip() else 0)
+        # The padding is overwritten too, so the length of the key is not kept. The space before any format options is
+        # left alone.
+        encrypted_file.seek(position)
+        encrypted_file.write(b'-' * slot_size)  # This can never be read as a number.
+        encrypted_file.flush()
+        os.fsync(encrypted_file.fileno())
+    return file_path
+
+
+@functools.lru_cache(maxsize=None)
+def _dialog():
+    """
+    This imports the password dialog the first time it is needed. tkinter is only imported here, so importing this
+    module is fast and works on servers without a display.
+    :return: Returns the simpledialog module.
+    :raises ImportError: If tkinter is not installed or there is no display to show the dialog on.
+    """
+    # I hate `tkinter`'s inconsistency.
+    if sys.version_info.major < 3 or sys.version_info.minor < 3:  # For Python 3.2.x and below (Untested)
+        import tkSimpleDialog as dialog
+    elif sys.version_info.minor < 6:  # For Python 3.3.x through 3.5.x (Untested)
+        from tkinter import simpledialog as dialog
+    else:  # For Python 3.6.x and above (Tested Python 3.10.6)
+        import tkinter
+        import tkinter.simpledialog as dialog
+
+        try:
+            tkinter.Tk().withdraw()  # Someone said this was necessary (It worked without in Python 3.10.6)
+        except tkinter.TclError as error:  # This happens on servers without a display.
+            raise ImportError(str(error))
+    return dialog
+
+
+def _print_stages(progress: Progress) -> None:
+    """
+    This prints the time spent in each stage for verbose output.
+    :param Progress progress: This is the progress of the job.
+    """
+    stages = ', '.join('{stage} {seconds}'.format(stage=stage if stage != 'xor' else 'XOR',
+                                                  seconds=round(progress.seconds[stage], 3))
+                       for stage in Progress.stages)
+    print('{blue}[v] {grey}Seconds spent per stage: {stages}{reset}'.format(blue=blue, grey=grey, reset=reset,
+                                                                           stages=stages))
 
 
 def encrypt(file_path: typing.Union[str, None] = None, password: typing.Union[str, None] = None,
-            verbose: bool = False) -> None:
+            verbose: bool = False, buffer_size: int = default_buffer_size, workers: int = 1,
+            memory_map: bool = False, progress: typing.Union[Progress, None] = None, in_place: bool = False,
+            integrity: bool = False, compression: typing.Union[str, None] = None) -> None:
     """
     This function encrypts any file.
     :param file_path: This is the file path for the file to be encrypted. If none is provided, you will be prompted for
@@ -53,6 +1596,23 @@ def encrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
     :type password: str or None
     :param bool verbose: If this is set to True, this will print what the function is doing at each step. Otherwise,
         those print statements are hidden. Defaults to False.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream the file. This only changes memory
+        usage and speed. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad. Each one holds up to two buffers.
+        Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped instead of read and written through
+        buffers. This is faster for very large files. Defaults to False.
+    :param progress: This is where the progress is reported while the file is processed. If verbose is set to True,
+        the time spent in each stage is printed at the end. Defaults to None.
+    :type progress: Progress or None
+    :param bool in_place: If this is set to True, the file is processed in its own blocks instead of being copied, so
+        almost no extra disk space is needed. If this is interrupted, running it again resumes it. Defaults to False.
+    :param bool integrity: If this is set to True, every block is stored with a tag, so `decrypt` and `verify` catch a
+        wrong password or corrupted data. This cannot be combined with in_place. Defaults to False.
+    :param compression: This is 'zlib', 'lzma' or 'zstd' to compress every block before it is encrypted, which makes
+        files like logs smaller and faster to write and read. The blocks are also tagged, as with integrity, and can
+        still be read with `open_decrypted`. zstd needs Python 3.14 or the zstandard module. Defaults to None.
+    :type compression: str or None
     """
     if not file_path:
         if verbose:
@@ -76,15 +1636,15 @@ def encrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
             print('{blue}[v] {yellow}Password not provided.{reset}'.format(blue=blue, yellow=yellow, reset=reset))
         while True:
             try:
-                password = dialog.askstring("Password", 'Enter the password to encrypt the file:', show='*')
+                password = _dialog().askstring("Password", 'Enter the password to encrypt the file:', show='*')
                 if not password:
                     print('{red}Operation canceled.{reset}'.format(red=red, reset=reset))
                     exit()
-                confirmation = dialog.askstring("Password", 'Enter the password again to verify it:', show='*')
+                confirmation = _dialog().askstring("Password", 'Enter the password again to verify it:', show='*')
                 if not confirmation:
                     print('{red}Operation canceled.{reset}'.format(red=red, reset=reset))
                     exit()
-            except ModuleNotFoundError:  # Please contact me if this happens
+            except ImportError:  # Please contact me if this happens (unless there is no display)
                 password = input('{bold}Enter the password to encrypt the file: {reset}'.format(bold=bold, reset=reset))
                 confirmation = input(
                     '{bold}Enter the password again to verify it: {reset}'.format(bold=bold, reset=reset))
@@ -102,84 +1662,39 @@ def encrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
         print('{blue}[v] {cyan}Decryption key: {reset}{bold}{key}{reset}'.format(blue=blue, cyan=cyan, bold=bold,
                                                                                  reset=reset,
                                                                                  key=decryption_key))
+    encrypted_file_name = decrypted_file_name + '.MOTP'
+    # This generates a file name compatible with the `decrypt` function.
+    encrypted_file_path = file_path + '.MOTP'
+    # This generates the file path used to store the encrypted file.
+    if os.path.exists(encrypted_file_path):
+        print('{red}[!] File {green}{path} {red}already exists.{reset}\n'.format(red=red, green=green, reset=reset,
+                                                                                 path=encrypted_file_path))
+        return
     if verbose:
-        print('{blue}[v] {grey}Opening file... ({green}{path}{grey}){reset}'.format(blue=blue, grey=grey, green=green,
-                                                                                    reset=reset, path=file_path))
-    with open(file_path, 'rb') as decrypted_file:
-        encrypted_file_name = decrypted_file_name + '.MOTP'
-        # This generates a file name compatible with the `decrypt` function.
-        encrypted_file_path = file_path.rstrip(decrypted_file_name) + encrypted_file_name
-        # This generates the file path used to store the encrypted file.
-        if os.path.exists(encrypted_file_path):
-            print(
-                '{red}[!] File {green}{path} {red}already exists.{reset}\n'.format(red=red, green=green, reset=reset,
-                                                                                   path=encrypted_file_path))
-
-        def generate_pad(seed, size: int) -> numpy.ndarray:
-            """
-            This generates a pseudorandom pad for the encryption.
-            :param seed: This is the default_rng seed to set the random outcome
-            :type seed: <class 'numpy.random._generator.Generator'>
-            :param int size: This is the size of the pad.
-            :return: Returns a numpy.ndarray of the pad.
-            :rtype: numpy.ndarray
-            """
-            return seed.integers(0, 255, size, dtype=numpy.uint8)
-
-        def apply_pad(data: bytes, pad: numpy.ndarray) -> numpy.ndarray:
-            """
-            This is the function that encrypts the data.
-            :param bytes data: This is the data to encrypt.
-            :param numpy.ndarray pad: This is the pad to encrypt the data with.
-            :return: Returns the encrypted data.
-            :rtype: numpy.ndarray
-            """
-            return bytearray(data) ^ pad
-
-        if verbose:
-            print('{blue}[v] {grey}Creating file... ({green}{path}{grey}){reset}'.format(blue=blue, grey=grey,
-                                                                                         green=green, reset=reset,
-                                                                                         path=encrypted_file_path))
-        file_size = os.path.getsize(file_path)
-        max_size = 1024 * 1024 * 1024
-        # This is the maximum size (in bytes) per chunk. This can be higher based on your RAM.
-        # THE FILE MUST BE DECRYPTED WITH THE SAME CHUNK SIZE YOU ENCRYPTED IT WITH.
-        with open(encrypted_file_path, 'wb') as encrypted_file:
-            try:
-                encrypted_file.write((decryption_key + '\n').encode())
-                # The newline is used to separate the decryption key from the rest of the file.
-                rng = numpy.random.default_rng(seed=int.from_bytes(bytes((password + decryption_key).encode()), 'big'))
-                # This randomizes the outcome of the encryption in a reversible way.
-                if verbose:
-                    print('{blue}[v] {grey}Encrypting file... ({cyan}{size} bytes{grey}){reset}'.format(blue=blue,
-                                                                                                        grey=grey,
-                                                                                                        cyan=cyan,
-                                                                                                        reset=reset,
-                                                                                                        size=file_size))
-                    start = time.perf_counter()  # This starts a timer to time the encryption.
-                for _ in range(int(file_size / max_size)):
-                    encrypted_file.write(apply_pad(decrypted_file.read(max_size), generate_pad(rng, max_size)))
-                excess_size = file_size % max_size
-                encrypted_file.write(apply_pad(decrypted_file.read(excess_size), generate_pad(rng, excess_size)))
-                end = time.perf_counter()
-                if verbose:
-                    seconds = end - start
-                    speed = round(file_size / seconds)
-                    message = '{blue}[v] {grey}Encrypted in {seconds} seconds. ({cyan}{speed:,} bytes per second{grey})'
-                    print((message + reset).format(blue=blue, grey=grey, cyan=cyan, seconds=round(seconds, 2),
-                                                   speed=speed))
-            except Exception as exception:
-                encrypted_file.close()
-                os.remove(encrypted_file_path)  # This removes the partially encrypted file.
-                decrypted_file.close()
-                raise exception
-        if verbose:
-            print('{blue}[v] {grey}Closing files...{reset}'.format(blue=blue, grey=grey, reset=reset))
-        encrypted_file.close()
-    decrypted_file.close()
+        print('{blue}[v] {grey}Creating file... ({green}{path}{grey}){reset}'.format(blue=blue, grey=grey, green=green,
+                                                                                     reset=reset,
+                                                                                     path=encrypted_file_path))
+    file_size = os.path.getsize(file_path)
     if verbose:
-        print('{blue}[v] {grey}Cleaning up...{reset}'.format(blue=blue, grey=grey, reset=reset))
-    os.remove(file_path)  # This removes the decrypted file.
+        print('{blue}[v] {grey}Encrypting file... ({cyan}{size} bytes{grey}){reset}'.format(blue=blue, grey=grey,
+                                                                                            cyan=cyan, reset=reset,
+                                                                                            size=file_size))
+        start = time.perf_counter()  # This starts a timer to time the encryption.
+        progress = progress or Progress()  # This times each stage.
+    _encrypt_file(file_path, password, buffer_size, workers, memory_map, in_place, integrity, decryption_key, progress,
+                  compression)
+    end = time.perf_counter()
+    if verbose:
+        seconds = end - start
+        speed = round(file_size / seconds)
+        message = '{blue}[v] {grey}Encrypted in {seconds} seconds. ({cyan}{speed:,} bytes per second{grey})'
+        print((message + reset).format(blue=blue, grey=grey, cyan=cyan, seconds=round(seconds, 2), speed=speed))
+        _print_stages(progress)
+        if compression is not None:
+            encrypted_size = os.path.getsize(encrypted_file_path)
+            message = '{blue}[v] {grey}Compressed to {cyan}{size:,} bytes{grey}. ({percent}% of the file)'
+            print((message + reset).format(blue=blue, grey=grey, cyan=cyan, size=encrypted_size,
+                                           percent=round(encrypted_size * 100 / max(file_size, 1), 1)))
     print('Encrypted as: {green}{name}{reset}'.format(green=green, reset=reset, name=encrypted_file_name))
     if verbose:
         print('{blue}[v] {green}Done!{reset}'.format(blue=blue, green=green, reset=reset))
@@ -187,7 +1702,8 @@ def encrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
 
 
 def decrypt(file_path: typing.Union[str, None] = None, password: typing.Union[str, None] = None,
-            verbose: bool = False) -> None:
+            verbose: bool = False, buffer_size: int = default_buffer_size, workers: int = 1,
+            memory_map: bool = False, progress: typing.Union[Progress, None] = None, in_place: bool = False) -> None:
     """
     This function decrypts a file encrypted with the `encrypt` function.
     :param file_path: This is the file path for the file to be decrypted. If none is provided, you will be prompted for
@@ -198,6 +1714,17 @@ def decrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
     :type password: str or None
     :param bool verbose: If this is set to True, this will print what the function is doing at each step. Otherwise,
         those print statements are hidden. Defaults to False.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream the file. This only changes memory
+        usage and speed. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad. Each one holds up to two buffers.
+        Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped instead of read and written through
+        buffers. This is faster for very large files. Defaults to False.
+    :param progress: This is where the progress is reported while the file is processed. If verbose is set to True,
+        the time spent in each stage is printed at the end. Defaults to None.
+    :type progress: Progress or None
+    :param bool in_place: If this is set to True, the file is processed in its own blocks instead of being copied, so
+        almost no extra disk space is needed. If this is interrupted, running it again resumes it. Defaults to False.
     """
     if not file_path:
         if verbose:
@@ -208,7 +1735,10 @@ def decrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
     while True:
         if verbose:
             print('{blue}[v] {grey}Checking file...{reset}'.format(blue=blue, grey=grey, reset=reset))
-        if os.path.isfile(file_path) and os.path.exists(file_path) and file_path.endswith('.MOTP'):
+        resuming = in_place and os.path.exists(file_path + '.journal')
+        # The header of a file whose in-place decryption was interrupted is already overwritten, and the file may
+        # have been renamed, so the job is resumed from its journal instead.
+        if (os.path.isfile(file_path) or resuming) and file_path.endswith('.MOTP'):
             if verbose:
                 print('{blue}[v] {green}File is valid.{reset}'.format(blue=blue, green=green, reset=reset))
             break
@@ -216,99 +1746,68 @@ def decrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
             print('{red}File is invalid.{reset}'.format(red=red, reset=reset))
             file_path = input('{bold}Enter the path of the file to decrypt: {reset}'.format(bold=bold, reset=reset))
     decrypted_file_name = os.path.splitext(os.path.basename(file_path))[0]
-    decrypted_file_path = file_path.rstrip(os.path.basename(file_path)) + decrypted_file_name
+    decrypted_file_path = file_path[:-len('.MOTP')]
     # This generates the file path used to store the decrypted file.
-    if os.path.exists(decrypted_file_path):
-        print('{red}[!] File {green}{path} {red}already exists.{reset}\n'.format(red=red, green=green, reset=reset,
-                                                                                 path=decrypted_file_path))
-        return
-    if verbose:
-        print('{blue}[v] {grey}Opening file...{reset}'.format(blue=blue, grey=grey, reset=reset))
-    with open(file_path, 'rb') as encrypted_file:
+    file_size = None
+    if not resuming:
+        if os.path.exists(decrypted_file_path):
+            print('{red}[!] File {green}{path} {red}already exists.{reset}\n'.format(red=red, green=green, reset=reset,
+                                                                                     path=decrypted_file_path))
+            return
         if verbose:
-            print('{blue}[v] {grey}Building decryption key...{reset}'.format(blue=blue, grey=grey, reset=reset))
-        decryption_key = encrypted_file.readlines(1)[0].decode().rstrip()
+            print('{blue}[v] {grey}Opening file...{reset}'.format(blue=blue, grey=grey, reset=reset))
+        with open(file_path, 'rb') as encrypted_file:
+            if verbose:
+                print('{blue}[v] {grey}Building decryption key...{reset}'.format(blue=blue, grey=grey, reset=reset))
+            version, decryption_key, _ = _read_header(encrypted_file)
+            file_size = os.path.getsize(file_path) - encrypted_file.tell()
+        if not 1 <= version <= format_version:
+            print('{red}[!] Format version is not supported.{reset}'.format(red=red, reset=reset))
+            return
         try:
             float(decryption_key)
         except ValueError:
             print('{red}[!] Decryption key is invalid or destroyed.{reset}'.format(red=red, reset=reset))
             return
-        if not password:
-            if verbose:
-                print('{blue}[v] {yellow}No password provided.{reset}'.format(blue=blue, yellow=yellow, reset=reset))
-            try:
-                password = dialog.askstring("Password", 'Enter the password to decrypt the file:', show='*')
-                if not password:
-                    print('{red}Operation canceled.{reset}'.format(red=red, reset=reset))
-                    exit()
-            except ModuleNotFoundError:  # Please contact me if this happens
-                password = input('{bold}Enter the password to decrypt the file: {reset}'.format(bold=bold, reset=reset))
-        elif verbose:
-            print('{blue}[v] {green}Password provided.{reset}'.format(blue=blue, green=green, reset=reset))
-
-        def generate_pad(seed, size: int) -> numpy.ndarray:
-            """
-            This generates a pseudorandom pad for the decryption.
-            :param seed: This is the default_rng seed to set the random outcome
-            :type seed: <class 'numpy.random._generator.Generator'>
-            :param int size: This is the size of the pad.
-            :return: Returns a numpy.ndarray of the pad.
-            :rtype: numpy.ndarray
-            """
-            return seed.integers(0, 255, size, dtype=numpy.uint8)
-
-        def apply_pad(data: bytes, pad: numpy.ndarray) -> numpy.ndarray:
-            """
-            This is the function that decrypts the data.
-            :param bytes data: This is the data to decrypt.
-            :param numpy.ndarray pad: This is the pad to decrypt the data with.
-            :return: Returns the decrypted data.
-            :rtype: numpy.ndarray
-            """
-            return bytearray(data) ^ pad
-
-        if verbose:
-            print('{blue}[v] {grey}Creating file... ({green}{path}{grey}){reset}'.format(blue=blue, grey=grey,
-                                                                                         green=green, reset=reset,
-                                                                                         path=decrypted_file_path))
-        file_size = os.path.getsize(file_path) - len(decryption_key) - 1
-        max_size = 1024 * 1024 * 1024
-        # This is the maximum size (in bytes) per chunk. This can be higher based on your RAM.
-        # THE FILE MUST BE DECRYPTED WITH THE SAME CHUNK SIZE YOU ENCRYPTED IT WITH.
-        with open(decrypted_file_path, 'wb') as decrypted_file:
-            try:
-                rng = numpy.random.default_rng(seed=int.from_bytes(bytes((password + decryption_key).encode()), 'big'))
-                # This sets the random outcome to reverse the encryption.
-                if verbose:
-                    print('{blue}[v] {grey}Decrypting file... ({cyan}{size} bytes{grey}){reset}'.format(blue=blue,
-                                                                                                        grey=grey,
-                                                                                                        cyan=cyan,
-                                                                                                        reset=reset,
-                                                                                                        size=file_size))
-                    start = time.perf_counter()  # This starts a timer to time the decryption.
-                for _ in range(int(file_size / max_size)):
-                    decrypted_file.write(apply_pad(encrypted_file.read(max_size), generate_pad(rng, max_size)))
-                excess_size = file_size % max_size
-                decrypted_file.write(apply_pad(encrypted_file.read(excess_size), generate_pad(rng, excess_size)))
-                end = time.perf_counter()
-                if verbose:
-                    seconds = end - start
-                    speed = round(file_size / seconds)
-                    message = '{blue}[v] {grey}Decrypted in {seconds} seconds. ({cyan}{speed:,} bytes per second{grey})'
-                    print((message + reset).format(blue=blue, grey=grey, cyan=cyan, seconds=round(seconds, 2),
-                                                   speed=speed))
-            except Exception as exception:
-                decrypted_file.close()
-                os.remove(decrypted_file_path)  # This removes the partially decrypted file.
-                encrypted_file.close()
-                raise exception
+    elif verbose:
+        print('{blue}[v] {yellow}Resuming an interrupted in-place decryption.{reset}'.format(blue=blue, yellow=yellow,
+                                                                                         reset=reset))
+    if not password:
         if verbose:
-            print('{blue}[v] {grey}Closing files...{reset}'.format(blue=blue, grey=grey, reset=reset))
-        decrypted_file.close()
-    encrypted_file.close()
+            print('{blue}[v] {yellow}No password provided.{reset}'.format(blue=blue, yellow=yellow, reset=reset))
+        try:
+            password = _dialog().askstring("Password", 'Enter the password to decrypt the file:', show='*')
+            if not password:
+                print('{red}Operation canceled.{reset}'.format(red=red, reset=reset))
+                exit()
+        except ImportError:  # Please contact me if this happens (unless there is no display)
+            password = input('{bold}Enter the password to decrypt the file: {reset}'.format(bold=bold, reset=reset))
+    elif verbose:
+        print('{blue}[v] {green}Password provided.{reset}'.format(blue=blue, green=green, reset=reset))
     if verbose:
-        print('{blue}[v] {grey}Cleaning up...{reset}'.format(blue=blue, grey=grey, reset=reset))
-    os.remove(file_path)  # This removes the encrypted file.
+        print('{blue}[v] {grey}Creating file... ({green}{path}{grey}){reset}'.format(blue=blue, grey=grey, green=green,
+                                                                                     reset=reset,
+                                                                                     path=decrypted_file_path))
+        if file_size is not None:
+            print('{blue}[v] {grey}Decrypting file... ({cyan}{size} bytes{grey}){reset}'.format(
+                blue=blue, grey=grey, cyan=cyan, reset=reset, size=file_size))
+        start = time.perf_counter()  # This starts a timer to time the decryption.
+        progress = progress or Progress()  # This times each stage.
+    try:
+        _decrypt_file(file_path, password, buffer_size, workers, memory_map, in_place, progress)
+    except (ValueError, ImportError) as error:
+        # This happens when a block of a version 3 file fails its check, or its compression is not installed.
+        print('{red}[!] {error}{reset}\n'.format(red=red, reset=reset, error=error))
+        return
+    end = time.perf_counter()
+    if verbose:
+        seconds = end - start
+        if file_size is None:
+            file_size = progress.total  # This is the size kept in the journal of the resumed job.
+        speed = round(file_size / seconds)
+        message = '{blue}[v] {grey}Decrypted in {seconds} seconds. ({cyan}{speed:,} bytes per second{grey})'
+        print((message + reset).format(blue=blue, grey=grey, cyan=cyan, seconds=round(seconds, 2), speed=speed))
+        _print_stages(progress)
     print('Decrypted as: {green}{name}{reset}'.format(green=green, reset=reset, name=decrypted_file_name))
     if verbose:
         print('{blue}[v] {green}Done!{reset}'.format(blue=blue, green=green, reset=reset))
@@ -318,7 +1817,8 @@ def decrypt(file_path: typing.Union[str, None] = None, password: typing.Union[st
 def destroy(file_path: typing.Union[str, None] = None, verbose: bool = False) -> None:
     """
     This function destroys the decryption key in an encrypted file, making it impossible to decrypt. This does not
-    delete the file. The key could be recovered via brute force. May cause MemoryError for large files.
+    delete the file. The key could be recovered via brute force. The key is overwritten in place, so this takes the
+    same time for any file size.
     :param file_path: This is the path of the file to have the key of destroyed.
     :type file_path: str or None
     :param bool verbose: If this is set to True, this will print what the function is doing at each step. Otherwise,
@@ -347,37 +1847,730 @@ def destroy(file_path: typing.Union[str, None] = None, verbose: bool = False) ->
     with open(file_path, 'rb') as encrypted_file:
         if verbose:
             print('{blue}[v] {grey}Finding decryption key...{reset}'.format(blue=blue, grey=grey, reset=reset))
-        decryption_key = encrypted_file.readlines(1)[0].decode().rstrip()
+        decryption_key = _read_header(encrypted_file)[1]
+    try:
+        float(decryption_key)
+    except ValueError:
+        print('{red}[!] Decryption key is invalid or already destroyed.{reset}'.format(red=red, reset=reset))
+        return
+    if verbose:
+        print('{blue}[v] {grey}Overwriting decryption key... ({cyan}{size} bytes{grey}){reset}'.format(
+            blue=blue, grey=grey, cyan=cyan, reset=reset, size=len(decryption_key)))
+        start = time.perf_counter()  # This starts a timer to time the writing.
+    try:
+        _destroy_file(file_path)
+    except ValueError as error:  # This happens when an in-place job on the file was interrupted.
+        print('{red}[!] {error}{reset}\n'.format(red=red, reset=reset, error=error))
+        return
+    end = time.perf_counter()
+    if verbose:
+        message = '{blue}[v] {grey}Wrote in {seconds} seconds.{reset}'
+        print(message.format(blue=blue, grey=grey, reset=reset, seconds=round(end - start, 6)))
+    if verbose:
+        print('{blue}[v] {green}Done!{reset}'.format(blue=blue, green=green, reset=reset))
+    print()
+
+
+def rekey(file_path: str, old_password: str, new_password: str, in_place: bool = False,
+          buffer_size: int = default_buffer_size, workers: int = 1, memory_map: bool = False,
+          progress: typing.Union[Progress, None] = None) -> str:
+    """
+    This function changes the password of an encrypted file in one pass, without writing the decrypted data anywhere.
+    Each chunk is XORed with the old and the new pad together, and the file gets a new decryption key. It never
+    prompts or prints. The old password is not checked, so a wrong one makes the file unreadable.
+    :param str file_path: This is the path of the encrypted file.
+    :param str old_password: This is the password the file is encrypted with.
+    :param str new_password: This is the new password.
+    :param bool in_place: If this is set to True, the file is changed in its own blocks instead of written to a
+        temporary file that then replaces it, so only a journal of two buffers is needed on disk. If this is
+        interrupted, running it again with the same passwords resumes it. workers and memory_map are not used.
+        Defaults to False.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream the file. Defaults to
+        `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pads. Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped. Defaults to False.
+    :param progress: This is where the progress is reported. Its total is set to the size of the data if it has none.
+        Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the path of the file.
+    :rtype: str
+    :raises FileExistsError: If the temporary file already exists.
+    :raises ValueError: If the file is not a version 2 file, its decryption key is invalid or destroyed, its header
+        cannot be rewritten in place, or an in-place change of its password was interrupted and in_place is not set to
+        True.
+    """
+    if in_place:
+        return _rekey_in_place(file_path, old_password, new_password, buffer_size, progress)
+    if os.path.exists(file_path + '.journal'):
+        raise ValueError('An in-place job on {path} was interrupted. Run the same job in place again to resume '
+                         'it.'.format(path=file_path))
+    decryption_key = str(numpy.random.default_rng().random())  # This generates a random decryption key.
+    header = _build_header(decryption_key)
+    buffer_size = min(buffer_size, max(os.path.getsize(file_path), 1))
+    # Small files do not need a full-sized buffer.
+    with open(file_path, 'rb') as encrypted_file:
+        old_keystream = _stream_keystream(_read_header(encrypted_file), old_password)
+        if progress is not None and progress.total is None:
+            progress.total = os.fstat(encrypted_file.fileno()).st_size - encrypted_file.tell()
+        keystream = KeystreamPair(old_keystream, Keystream(new_password, decryption_key))
+        temporary_file_path = file_path + '.rekey'
+        if os.path.exists(temporary_file_path):
+            raise FileExistsError('File {path} already exists.'.format(path=temporary_file_path))
+        with open(temporary_file_path, 'w+b' if memory_map else 'wb') as temporary_file:
+            try:
+                temporary_file.write(header)
+                (_apply_keystream_mapped if memory_map else _apply_keystream)(encrypted_file, temporary_file,
+                                                                              keystream, buffer_size, workers,
+                                                                              progress)
+                temporary_file.flush()
+                os.fsync(temporary_file.fileno())
+                # The new file is synced before it replaces the old one, so a crash cannot leave a partial file.
+            except Exception as exception:
+                temporary_file.close()
+                os.remove(temporary_file_path)  # This removes the partially re-encrypted file.
+                raise exception
+    os.replace(temporary_file_path, file_path)
+    return file_path
+
+
+def verify(file_path: str, password: str, buffer_size: int = default_buffer_size,
+           workers: typing.Union[int, None] = None) -> str:
+    """
+    This function checks every block of a file encrypted with integrity tags, without decrypting or writing anything.
+    The first block is checked on its own before the others, so a wrong password is caught after reading one block.
+    The other blocks are checked on a thread pool, and this stops soon after a block fails. It never prompts or prints.
+    :param str file_path: This is the path of the encrypted file.
+    :param str password: This is the password used to encrypt the file.
+    :param int buffer_size: This is the size (in bytes) of the chunks handed to each thread. Defaults to
+        `default_buffer_size`.
+    :param workers: This is the number of threads used to check the blocks. Each one holds up to two buffers. If none
+        is provided, the number of CPUs is used. It is never more than the number of chunks in the file. Defaults to
+        None.
+    :type workers: int or None
+    :return: Returns the path of the file.
+    :rtype: str
+    :raises ValueError: If the file has no integrity tags (it is not a version 3 file), its decryption key is invalid
+        or destroyed, a block fails its check, or the data is cut off.
+    :raises ImportError: If the blocks are compressed with zstd and it is not installed.
+    """
+    with open(file_path, 'rb') as encrypted_file:
+        version, decryption_key, options = _read_header(encrypted_file)
+        if version != 3:
+            raise ValueError('File {path} has no integrity tags.'.format(path=file_path))
         try:
             float(decryption_key)
         except ValueError:
-            print('{red}[!] Decryption key is invalid or already destroyed.{reset}'.format(red=red, reset=reset))
-            return
-        decryption_key_length = len(decryption_key)
-        data = b'\n' + encrypted_file.read()
-    encrypted_file.close()
-    file_size = os.path.getsize(file_path) - decryption_key_length - 1
-    with open(file_path, 'wb') as encrypted_file:
+            raise ValueError('Decryption key is invalid or destroyed.')
+        block_size, codec = _block_options(options)
+        size = max(os.fstat(encrypted_file.fileno()).st_size - encrypted_file.tell(), 1)
+        buffer_size = min(buffer_size, size)
+        workers = min(workers or os.cpu_count() or 1, -(-size // buffer_size))
+        # Each worker holds up to two buffers, so small files do not get full-sized buffers or more workers than
+        # chunks.
+        _apply_blocks(encrypted_file, None, None, _tagger(password, decryption_key, options), block_size, False,
+                      buffer_size, workers, codec=codec)
+        # Compressed blocks are checked without being decompressed.
+    return file_path
+
+
+class DecryptedFile(io.RawIOBase):
+    """
+    This is a read-only, seekable view of the decrypted contents of a version 2 or 3 file. Only the parts that are read
+    are decrypted, and seeking moves the keystream straight to the new position instead of generating it from the
+    start. Blocks of version 3 files are checked as they are read. Compressed blocks have different sizes, so where
+    each one starts is read from the index after the last block when the file is opened. Use `open_decrypted` to get a
+    buffered one.
+    """
+
+    def __init__(self, file_path: str, password: str) -> None:
+        """
+        :param str file_path: This is the path of the encrypted file.
+        :param str password: This is the password used to encrypt the file.
+        :raises ValueError: If the file is not a version 2 or 3 file, its decryption key is invalid or destroyed, or
+            (for version 3 files) its last block or its block index fails its check or is missing.
+        :raises ImportError: If the blocks are compressed with zstd and it is not installed.
+        """
+        super().__init__()
+        self.encrypted_file = open(file_path, 'rb', buffering=0)
         try:
-            if verbose:
-                print(
-                    '{blue}[v] {grey}Writing to file... ({cyan}{size} bytes{grey}){reset}'.format(blue=blue, grey=grey,
-                                                                                                  cyan=cyan,
-                                                                                                  reset=reset,
-                                                                                                  size=file_size))
-                start = time.perf_counter()  # This starts a timer to time the writing.
-            encrypted_file.write(data)
-            end = time.perf_counter()
-            if verbose:
-                seconds = end - start
-                speed = round(file_size / seconds)
-                message = '{blue}[v] {grey}Wrote in {seconds} seconds. ({cyan}{speed:,} bytes per second{grey}){reset}'
-                print(message.format(blue=blue, grey=grey, cyan=cyan, reset=reset, seconds=round(seconds, 2),
-                                     speed=speed))
-        except Exception as exception:
-            encrypted_file.close()
-            raise exception
-    encrypted_file.close()
-    if verbose:
-        print('{blue}[v] {green}Done!{reset}'.format(blue=blue, green=green, reset=reset))
-    print()
+            version, decryption_key, options = _read_header(self.encrypted_file)
+            if version not in (2, 3):
+                raise ValueError('Only version 2 and 3 files can be opened without decrypting them.')
+            try:
+                float(decryption_key)
+            except ValueError:
+                raise ValueError('Decryption key is invalid or destroyed.')
+            self.data_start = self.encrypted_file.tell()
+            self.size = os.fstat(self.encrypted_file.fileno()).st_size - self.data_start
+            self.keystream = Keystream(password, decryption_key)
+            self.position = 0
+            self.block_size = self.tag = self.block = self.codec = self.offsets = None
+            if version == 3:
+                self.block_size, self.codec = _block_options(options)
+                self.tag = _tagger(password, decryption_key, options)
+                if self.codec is None:
+                    records, last_size = divmod(self.size, tag_size + self.block_size)
+                    if not last_size:
+                        raise ValueError('Data is cut off.')
+                    self.size = records * self.block_size + last_size - tag_size
+                    self.read_block(records)  # This checks the last block, which also catches a wrong password.
+                else:
+                    self.offsets = self.find_blocks()
+                    records = len(self.offsets) - 2  # The offsets end with the end of the last block.
+                    self.size = records * self.block_size + len(self.read_block(records))
+                    # This checks the last block, which is the only one with the last block flag.
+        except Exception:
+            self.encrypted_file.close()
+            raise
+
+    def read_block(self, number: int) -> numpy.ndarray:
+        """
+        This reads, checks and decrypts a block of a version 3 file. The last block read is kept.
+        :param int number: This is the number of the block.
+        :return: Returns the decrypted block.
+        :rtype: numpy.ndarray
+        :raises ValueError: If the block fails its check.
+        """
+        if self.block is not None and self.block[0] == number:
+            return self.block[1]
+        if self.codec is None:
+            self.encrypted_file.seek(self.data_start + number * (tag_size + self.block_size))
+            record = self.encrypted_file.read(tag_size + self.block_size)
+            block = numpy.frombuffer(_check_block(self.tag, number, record, self.block_size), dtype=numpy.uint8).copy()
+            self.keystream.seek(number * self.block_size)
+            self.keystream.apply(block)
+        else:
+            start, end = (int(offset) for offset in self.offsets[number:number + 2])
+            self.encrypted_file.seek(start)
+            header = self.encrypted_file.read(record_prefix.size + tag_size)
+            stored = bytearray(end - start - len(header))
+            self.encrypted_file.readinto(stored)
+            block = numpy.frombuffer(_open_block(self.tag, self.codec[1], self.keystream, number, header, stored,
+                                                 self.block_size, number * self.block_size), dtype=numpy.uint8)
+        self.block = number, block
+        return block
+
+    def find_blocks(self) -> numpy.ndarray:
+        """
+        This finds where each block of a compressed version 3 file starts, from the index after the last block (see
+        `_block_index`). Only the index is read, and it is checked against its tag.
+        :return: Returns the offset of every block in the file, followed by the end of the last one.
+        :rtype: numpy.ndarray
+        :raises ValueError: If the data is cut off, continues after the last block, or the index fails its check.
+        """
+        import hmac
+
+        end = self.data_start + self.size
+        if self.size < block_index_footer.size:
+            raise ValueError('Data is cut off.')
+        self.encrypted_file.seek(end - block_index_footer.size)
+        count = block_index_footer.unpack(self.encrypted_file.read(block_index_footer.size))[0]
+        index_size = count * record_prefix.size + tag_size + block_index_footer.size
+        if not count or index_size > self.size:
+            raise ValueError('Data is cut off.')
+        self.encrypted_file.seek(end - index_size)
+        table = self.encrypted_file.read(count * record_prefix.size)
+        if not hmac.compare_digest(self.encrypted_file.read(tag_size), self.tag(count, True, b'MOTP index', table)):
+            raise ValueError('The block index failed its check. The password is wrong or the data is corrupted.')
+        sizes = numpy.frombuffer(table, dtype='<u4').astype(numpy.int64) & (last_block_flag - 1)
+        offsets = numpy.empty(count + 1, dtype=numpy.int64)
+        offsets[0] = self.data_start
+        numpy.cumsum(sizes + record_prefix.size + tag_size, out=offsets[1:])
+        offsets[1:] += self.data_start
+        if offsets[-1] > end - index_size:
+            raise ValueError('Data is cut off.')
+        if offsets[-1] < end - index_size:
+            raise ValueError('Data continues after the last block.')
+        return offsets
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """
+        This moves to a position in the decrypted data.
+        :param int offset: This is the position, relative to whence.
+        :param int whence: This is io.SEEK_SET, io.SEEK_CUR or io.SEEK_END. Defaults to io.SEEK_SET.
+        :return: Returns the new position.
+        :rtype: int
+        """
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError('Invalid whence ({whence}).'.format(whence=whence))
+        if offset < 0:
+            raise ValueError('Negative seek position {offset}.'.format(offset=offset))
+        if offset != self.position and self.block_size is None:
+            self.encrypted_file.seek(self.data_start + offset)
+            self.keystream.seek(offset)
+        self.position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self.position
+
+    def readinto(self, buffer: typing.Union[bytearray, memoryview]) -> int:
+        """
+        This reads and decrypts data from the current position. For version 3 files, at most the rest of one block is
+        read at a time.
+        :param buffer: This is where the data is stored.
+        :type buffer: bytearray or memoryview
+        :return: Returns the number of bytes read.
+        :rtype: int
+        :raises ValueError: If a block fails its check (version 3 files).
+        """
+        if self.block_size is None:
+            size = self.encrypted_file.readinto(buffer)
+            if size:
+                self.keystream.apply(numpy.frombuffer(buffer, dtype=numpy.uint8, count=size))
+        elif self.position >= self.size:
+            size = 0
+        else:
+            number, offset = divmod(self.position, self.block_size)
+            block = self.read_block(number)
+            size = min(len(buffer), len(block) - offset)
+            numpy.frombuffer(buffer, dtype=numpy.uint8, count=size)[:] = block[offset:offset + size]
+        self.position += size or 0
+        return size
+
+    def close(self) -> None:
+        self.encrypted_file.close()
+        super().close()
+
+
+def open_decrypted(file_path: str, password: str, buffer_size: int = io.DEFAULT_BUFFER_SIZE) -> io.BufferedReader:
+    """
+    This function opens a file encrypted with the `encrypt` function for reading, without decrypting it to disk or
+    removing it. The time taken by a read or seek only depends on the amount of data read, not on its position in the
+    file, so it can be used to serve parts of large files.
+    :param str file_path: This is the path of the encrypted file.
+    :param str password: This is the password used to encrypt the file.
+    :param int buffer_size: This is the size (in bytes) of the read buffer. Defaults to io.DEFAULT_BUFFER_SIZE.
+    :return: Returns a seekable, read-only binary file object. It should be closed when it is no longer needed.
+    :rtype: io.BufferedReader
+    :raises ValueError: If the file is not a version 2 or 3 file, its decryption key is invalid or destroyed, or (for
+        version 3 files) its last block or its block index fails its check or is missing.
+    """
+    return io.BufferedReader(DecryptedFile(file_path, password), buffer_size)
+
+
+def encrypt_stream(source: typing.BinaryIO, destination: typing.BinaryIO, password: str,
+                   buffer_size: int = default_buffer_size, workers: int = 1,
+                   progress: typing.Union[Progress, None] = None, integrity: bool = False,
+                   compression: typing.Union[str, None] = None) -> int:
+    """
+    This function encrypts everything read from a binary reader (a pipe, a socket file, an upload body...) and writes
+    it in the same format as `encrypt` to a binary writer, one buffer at a time. Nothing is written to disk.
+    :param source: This is the reader. It is read until it runs out of data.
+    :type source: typing.BinaryIO
+    :param destination: This is the writer.
+    :type destination: typing.BinaryIO
+    :param str password: This is the password used to encrypt the data.
+    :param int buffer_size: This is the size (in bytes) of the buffer. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad. Defaults to 1.
+    :param progress: This is where the progress is reported. Its total is left as it is, since the size of the data
+        is not known. Defaults to None.
+    :type progress: Progress or None
+    :param bool integrity: If this is set to True, the data is written in the version 3 format, where every block is
+        stored with a tag. Defaults to False.
+    :param compression: This is the compression of the blocks, one of `compressions`. If one is given, the data is
+        written in the version 3 format as with integrity, and every block is compressed. Defaults to None.
+    :type compression: str or None
+    :return: Returns the number of bytes encrypted.
+    :rtype: int
+    :raises ValueError: If the compression is not supported.
+    :raises ImportError: If the compression is zstd and it is not installed.
+    """
+    decryption_key = str(numpy.random.default_rng().random())  # This generates a random decryption key.
+    keystream = Keystream(password, decryption_key)
+    if integrity or compression is not None:
+        options = _format_options(compression)
+        codec = _codec(compression) if compression is not None else None
+        destination.write(_build_header(decryption_key, options))
+        return _apply_blocks(source, destination, keystream, _tagger(password, decryption_key, options),
+                             default_block_size, True, buffer_size, workers, progress, codec)
+    destination.write(_build_header(decryption_key))
+    return _apply_keystream(source, destination, keystream, buffer_size, workers, progress)
+
+
+def decrypt_stream(source: typing.BinaryIO, destination: typing.BinaryIO, password: str,
+                   buffer_size: int = default_buffer_size, workers: int = 1,
+                   progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This function decrypts data written by `encrypt` or `encrypt_stream` from a binary reader to a binary writer, one
+    buffer at a time. Nothing is written to disk.
+    :param source: This is the reader. It is read until it runs out of data.
+    :type source: typing.BinaryIO
+    :param destination: This is the writer.
+    :type destination: typing.BinaryIO
+    :param str password: This is the password used to encrypt the data.
+    :param int buffer_size: This is the size (in bytes) of the buffer. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad. Defaults to 1.
+    :param progress: This is where the progress is reported. Its total is left as it is, since the size of the data
+        is not known. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes decrypted.
+    :rtype: int
+    :raises ValueError: If the data is not version 2 or 3 data, its decryption key is invalid or destroyed, or a block
+        fails its check (version 3 data). Blocks are checked before they are written.
+    :raises ImportError: If the blocks are compressed with zstd and it is not installed.
+    """
+    header = _read_header(source)
+    keystream = _stream_keystream(header, password, (2, 3))
+    if header[0] == 3:
+        block_size, codec = _block_options(header[2])
+        return _apply_blocks(source, destination, keystream, _tagger(password, header[1], header[2]), block_size,
+                             False, buffer_size, workers, progress, codec)
+    return _apply_keystream(source, destination, keystream, buffer_size, workers, progress)
+
+
+def _stream_keystream(header: typing.Tuple[int, str, typing.Dict[str, str]], password: str,
+                      versions: typing.Tuple[int, ...] = (2,)) -> Keystream:
+    """
+    This checks the header of streamed data and makes its keystream. Version 1 data is not supported, because its pad
+    has to be generated 1 GiB at a time.
+    :param tuple header: This is the format version, the decryption key and the format options.
+    :param str password: This is the password used to encrypt the data.
+    :param tuple versions: These are the format versions supported by the caller. Defaults to (2,).
+    :return: Returns the keystream.
+    :rtype: Keystream
+    :raises ValueError: If the format version is not supported or the decryption key is invalid or destroyed.
+    """
+    version, decryption_key, _ = header
+    if version not in versions:
+        raise ValueError('Only version {versions} data is supported.'.format(
+            versions=' and '.join(str(version) for version in versions)))
+    try:
+        float(decryption_key)
+    except ValueError:
+        raise ValueError('Decryption key is invalid or destroyed.')
+    return Keystream(password, decryption_key)
+
+
+async def _apply_keystream_async(reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter', keystream: Keystream,
+                                 buffer_size: int, executor: typing.Union[concurrent.futures.Executor, None],
+                                 progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This streams data from an asyncio reader to an asyncio writer, XORing it with the keystream on the way. Chunks of
+    64 KiB or more are XORed on the executor, so the event loop is never blocked by generating the pad.
+    :param asyncio.StreamReader reader: This is the reader. It is read until it runs out of data.
+    :param asyncio.StreamWriter writer: This is the writer. Anything with `write` and `drain` works.
+    :param Keystream keystream: This is the keystream to apply, positioned at the start of the data.
+    :param int buffer_size: This is the largest chunk read at once.
+    :param executor: This is the executor to XOR on. If none is provided, the loop's default executor is used.
+    :type executor: concurrent.futures.Executor or None
+    :param progress: This is where the progress is reported after every chunk. The read and write times include the
+        time spent waiting for the other end. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes written.
+    :rtype: int
+    """
+    import asyncio
+
+    keystream.progress = progress
+    loop = asyncio.get_running_loop()
+    total = 0
+    while True:
+        start = time.perf_counter()
+        data = await reader.read(buffer_size)
+        if not data:
+            break
+        read_end = time.perf_counter()
+        out = numpy.empty(len(data), dtype=numpy.uint8)
+        # A new array is used for each chunk, because the writer can keep a reference to it until it is sent.
+        if len(data) >= 64 * 1024:
+            await loop.run_in_executor(executor, keystream.apply, numpy.frombuffer(data, dtype=numpy.uint8), out)
+        else:
+            keystream.apply(numpy.frombuffer(data, dtype=numpy.uint8), out)
+        write_start = time.perf_counter()
+        writer.write(memoryview(out))
+        await writer.drain()
+        total += len(data)
+        if progress is not None:
+            progress.advance(len(data), read=read_end - start, write=time.perf_counter() - write_start)
+    if progress is not None:
+        progress.finish()
+    return total
+
+
+async def encrypt_stream_async(reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter', password: str,
+                               buffer_size: int = default_buffer_size,
+                               executor: typing.Union[concurrent.futures.Executor, None] = None,
+                               progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This function is the asyncio version of `encrypt_stream`. The pad is generated on an executor, so many transfers
+    can run on one event loop.
+    :param asyncio.StreamReader reader: This is the reader. It is read until it runs out of data.
+    :param asyncio.StreamWriter writer: This is the writer. It is not closed.
+    :param str password: This is the password used to encrypt the data.
+    :param int buffer_size: This is the largest chunk read at once. Defaults to `default_buffer_size`.
+    :param executor: This is the executor the pad is generated on. If none is provided, the loop's default executor is
+        used. Defaults to None.
+    :type executor: concurrent.futures.Executor or None
+    :param progress: This is where the progress is reported. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes encrypted.
+    :rtype: int
+    """
+    decryption_key = str(numpy.random.default_rng().random())  # This generates a random decryption key.
+    writer.write(_build_header(decryption_key))
+    return await _apply_keystream_async(reader, writer, Keystream(password, decryption_key), buffer_size, executor,
+                                        progress)
+
+
+async def decrypt_stream_async(reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter', password: str,
+                               buffer_size: int = default_buffer_size,
+                               executor: typing.Union[concurrent.futures.Executor, None] = None,
+                               progress: typing.Union[Progress, None] = None) -> int:
+    """
+    This function is the asyncio version of `decrypt_stream`.
+    :param asyncio.StreamReader reader: This is the reader. It is read until it runs out of data.
+    :param asyncio.StreamWriter writer: This is the writer. It is not closed.
+    :param str password: This is the password used to encrypt the data.
+    :param int buffer_size: This is the largest chunk read at once. Defaults to `default_buffer_size`.
+    :param executor: This is the executor the pad is generated on. If none is provided, the loop's default executor is
+        used. Defaults to None.
+    :type executor: concurrent.futures.Executor or None
+    :param progress: This is where the progress is reported. Defaults to None.
+    :type progress: Progress or None
+    :return: Returns the number of bytes decrypted.
+    :rtype: int
+    :raises ValueError: If the data is not version 2 data or its decryption key is invalid or destroyed.
+    """
+    keystream = _stream_keystream(_read_header(io.BytesIO(await reader.readline())), password)
+    return await _apply_keystream_async(reader, writer, keystream, buffer_size, executor, progress)
+
+
+FileResult = collections.namedtuple('FileResult', ['path', 'output_path', 'size', 'seconds', 'error'])
+# This is the result for one file in a batch. `output_path` is None and `error` is the exception if the file failed.
+# `size` is the size of the decrypted data for encrypting and decrypting, the size of the file for verifying (all of it
+# is read), and 0 for destroying (only the key is written).
+BatchResult = collections.namedtuple('BatchResult', ['results', 'size', 'seconds', 'speed', 'errors'])
+# This is the result of a batch: the FileResult of every file in the order given, the total bytes processed, the
+# total time, the speed in bytes per second and the FileResult of every file that failed.
+
+
+def _run_file(function: typing.Callable, file_path: str, arguments: tuple) -> FileResult:
+    """
+    This runs `_encrypt_file`, `_decrypt_file` or `_destroy_file` on one file of a batch, catching errors so one bad
+    file does not stop the others.
+    :param function: This is the function to run.
+    :type function: typing.Callable
+    :param str file_path: This is the path of the file.
+    :param tuple arguments: These are the arguments passed to the function after the path.
+    :return: Returns the result for the file.
+    :rtype: FileResult
+    """
+    start = time.perf_counter()
+    try:
+        size = 0 if function is _destroy_file else os.path.getsize(file_path)
+        output_path = function(file_path, *arguments)
+        if function is _decrypt_file:
+            size = os.path.getsize(output_path)  # This leaves out the header and any tags.
+    except Exception as exception:
+        return FileResult(file_path, None, 0, time.perf_counter() - start, exception)
+    return FileResult(file_path, output_path, size, time.perf_counter() - start, None)
+
+
+def _run_many(function: typing.Callable, file_paths: typing.Iterable[str], arguments: tuple,
+              jobs: typing.Union[int, None], processes: bool) -> BatchResult:
+    """
+    This runs `_encrypt_file`, `_decrypt_file` or `_destroy_file` on many files at once. Paths are taken from the
+    iterable as files finish, so at most two files per job are in flight and the iterable can be a generator.
+    :return: Returns the result of the batch.
+    :rtype: BatchResult
+    """
+    jobs = jobs or os.cpu_count() or 1
+    executor_class = concurrent.futures.ProcessPoolExecutor if processes else concurrent.futures.ThreadPoolExecutor
+    results = []
+    pending = {}
+    start = time.perf_counter()
+    with executor_class(jobs) as executor:
+        for index, file_path in enumerate(file_paths):
+            if len(pending) >= jobs * 2:  # This bounds the memory used by files in flight.
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                results.extend((pending.pop(future), future.result()) for future in done)
+            pending[executor.submit(_run_file, function, file_path, arguments)] = index
+        results.extend((pending[future], future.result()) for future in concurrent.futures.as_completed(pending))
+    seconds = time.perf_counter() - start
+    results = [result for _, result in sorted(results, key=lambda item: item[0])]
+    size = sum(result.size for result in results)
+    return BatchResult(results, size, seconds, size / seconds if seconds else 0.0,
+                       [result for result in results if result.error is not None])
+
+
+def encrypt_many(file_paths: typing.Iterable[str], password: str, jobs: typing.Union[int, None] = None,
+                 processes: bool = False, buffer_size: int = default_buffer_size, workers: int = 1,
+                 memory_map: bool = False, in_place: bool = False, integrity: bool = False,
+                 compression: typing.Union[str, None] = None) -> BatchResult:
+    """
+    This function encrypts many files at once with the same password. It never prompts or prints, and a file that
+    fails does not stop the others.
+    :param file_paths: These are the paths of the files to encrypt.
+    :type file_paths: typing.Iterable[str]
+    :param str password: This is the password used to encrypt the files.
+    :param jobs: This is the number of files processed at once. If none is provided, the number of CPUs is used.
+        Defaults to None.
+    :type jobs: int or None
+    :param bool processes: If this is set to True, files are processed on a process pool instead of a thread pool.
+        This helps with many small files, where the time goes into Python rather than NumPy. Defaults to False.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream each file. At most two buffers per
+        job are in use at once. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad of each file. Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped. Defaults to False.
+    :param bool in_place: If this is set to True, each file is processed in its own blocks instead of being copied.
+        Defaults to False.
+    :param bool integrity: If this is set to True, every block is stored with a tag. Defaults to False.
+    :param compression: This is the compression of the blocks, one of `compressions`. Defaults to None.
+    :type compression: str or None
+    :return: Returns the result for every file and the totals.
+    :rtype: BatchResult
+    """
+    return _run_many(_encrypt_file, file_paths, (password, buffer_size, workers, memory_map, in_place, integrity, None,
+                                                 None, compression), jobs, processes)
+
+
+def decrypt_many(file_paths: typing.Iterable[str], password: str, jobs: typing.Union[int, None] = None,
+                 processes: bool = False, buffer_size: int = default_buffer_size, workers: int = 1,
+                 memory_map: bool = False, in_place: bool = False) -> BatchResult:
+    """
+    This function decrypts many files encrypted with the same password at once. It never prompts or prints, and a file
+    that fails does not stop the others.
+    :param file_paths: These are the paths of the files to decrypt.
+    :type file_paths: typing.Iterable[str]
+    :param str password: This is the password used to encrypt the files.
+    :param jobs: This is the number of files processed at once. If none is provided, the number of CPUs is used.
+        Defaults to None.
+    :type jobs: int or None
+    :param bool processes: If this is set to True, files are processed on a process pool instead of a thread pool.
+        Defaults to False.
+    :param int buffer_size: This is the size (in bytes) of the buffer used to stream each file. At most two buffers per
+        job are in use at once. Defaults to `default_buffer_size`.
+    :param int workers: This is the number of threads used to generate the pad of each file. Defaults to 1.
+    :param bool memory_map: If this is set to True, the files are memory-mapped. Defaults to False.
+    :param bool in_place: If this is set to True, each file is processed in its own blocks instead of being copied.
+        Defaults to False.
+    :return: Returns the result for every file and the totals. The sizes are those of the decrypted files.
+    :rtype: BatchResult
+    """
+    return _run_many(_decrypt_file, file_paths, (password, buffer_size, workers, memory_map, in_place), jobs,
+                     processes)
+
+
+def destroy_many(file_paths: typing.Iterable[str], jobs: typing.Union[int, None] = None,
+                 processes: bool = False) -> BatchResult:
+    """
+    This function destroys the decryption keys of many encrypted files at once. It never prompts or prints, and a file
+    that fails does not stop the others. Only the keys are overwritten, so this is fast for files of any size.
+    :param file_paths: These are the paths of the encrypted files.
+    :type file_paths: typing.Iterable[str]
+    :param jobs: This is the number of files processed at once. If none is provided, the number of CPUs is used.
+        Defaults to None.
+    :type jobs: int or None
+    :param bool processes: If this is set to True, files are processed on a process pool instead of a thread pool.
+        Defaults to False.
+    :return: Returns the result for every file and the totals. The sizes are 0, since only the keys are written.
+    :rtype: BatchResult
+    """
+    return _run_many(_destroy_file, file_paths, (), jobs, processes)
+
+
+def _expand_paths(patterns: typing.Iterable[str], encrypted: bool) -> typing.Iterator[str]:
+    """
+    This expands files, directories (recursively) and glob patterns into file paths.
+    :param patterns: These are the files, directories and glob patterns.
+    :type patterns: typing.Iterable[str]
+    :param bool encrypted: If this is set to True, only '.MOTP' files are kept. Otherwise, they are skipped. Journals
+        and temporary files of interrupted jobs (see `sidecar_extensions`) are always skipped.
+    :return: Returns an iterator of file paths.
+    :rtype: typing.Iterator[str]
+    """
+    import glob
+
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True) or [pattern]:
+            if os.path.isdir(path):
+                file_paths = (os.path.join(directory, name) for directory, _, names in os.walk(path) for name in names)
+            else:
+                file_paths = [path]
+            for file_path in file_paths:
+                if file_path.endswith('.MOTP') == encrypted and not file_path.endswith(sidecar_extensions):
+                    yield file_path
+
+
+def _main(arguments: typing.Union[typing.List[str], None] = None) -> int:
+    """
+    This is the command line interface.
+    :param arguments: These are the command line arguments. If none are provided, sys.argv is used. Defaults to None.
+    :type arguments: list or None
+    :return: Returns the exit code.
+    :rtype: int
+    """
+    import argparse
+    import getpass
+
+    parser = argparse.ArgumentParser(prog='MOTP.py', description='Modified One-Time Pad')
+    parser.add_argument('command', choices=['encrypt', 'decrypt', 'destroy', 'verify'])
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='files, directories and glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, help='files processed at once (default: number of CPUs)')
+    parser.add_argument('-p', '--processes', action='store_true', help='use a process pool instead of threads')
+    parser.add_argument('-b', '--buffer-size', type=int, default=default_buffer_size, help='buffer size in bytes')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='threads used for each file (default: 1, or the CPUs split between the jobs for verify)')
+    parser.add_argument('-m', '--memory-map', action='store_true', help='memory-map the files')
+    parser.add_argument('-i', '--in-place', action='store_true',
+                        help='process files in their own blocks, resuming interrupted runs')
+    parser.add_argument('-t', '--integrity', action='store_true', help='store a tag with every block when encrypting')
+    parser.add_argument('-c', '--compress', choices=compressions,
+                        help='compress every block when encrypting (also stores a tag with every block)')
+    arguments = parser.parse_args(arguments)
+    workers = arguments.workers or 1
+    if arguments.command == 'destroy':
+        batch = destroy_many(_expand_paths(arguments.paths, True), arguments.jobs, arguments.processes)
+    else:
+        password = os.environ.get('MOTP_PASSWORD')
+        if not password:
+            password = getpass.getpass(
+                'Enter the password to {command} the files: '.format(command=arguments.command))
+            if not password:
+                print('{red}Operation canceled.{reset}'.format(red=red, reset=reset))
+                return 1
+            if arguments.command == 'encrypt' and getpass.getpass(
+                    'Enter the password again to verify it: ') != password:
+                print('{red}Passwords do not match.{reset}'.format(red=red, reset=reset))
+                return 1
+        if arguments.command == 'encrypt':
+            batch = encrypt_many(_expand_paths(arguments.paths, False), password, arguments.jobs, arguments.processes,
+                                 arguments.buffer_size, workers, arguments.memory_map, arguments.in_place,
+                                 arguments.integrity, arguments.compress)
+        elif arguments.command == 'decrypt':
+            batch = decrypt_many(_expand_paths(arguments.paths, True), password, arguments.jobs, arguments.processes,
+                                 arguments.buffer_size, workers, arguments.memory_map, arguments.in_place)
+        else:
+            file_paths = list(_expand_paths(arguments.paths, True))
+            cpus = os.cpu_count() or 1
+            jobs = arguments.jobs or max(min(cpus, len(file_paths)), 1)
+            if not arguments.workers:
+                workers = max(cpus // jobs, 1)
+                # `verify` shares the CPUs between the files checked at once, so a single file gets every CPU.
+            batch = _run_many(verify, file_paths, (password, arguments.buffer_size, workers), jobs,
+                              arguments.processes)
+    for result in batch.errors:
+        print('{red}[!] {path}: {error}{reset}'.format(red=red, reset=reset, path=result.path, error=result.error))
+    message = '{verb} {count} files ({cyan}{size:,} bytes{reset}) in {seconds} seconds. ({cyan}{speed:,} bytes per ' \
+              'second{reset})'
+    if arguments.command == 'destroy':
+        message = '{verb} {count} files in {seconds} seconds.'  # Only the keys are written, so there is no speed.
+    verb = 'Verified' if arguments.command == 'verify' else arguments.command.capitalize().rstrip('e') + 'ed'
+    print(message.format(verb=verb, count=len(batch.results) - len(batch.errors), cyan=cyan, reset=reset,
+                         size=batch.size, seconds=round(batch.seconds, 2), speed=round(batch.speed)))
+    return 1 if batch.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main())
@@ -0,0 +1,298 @@
+# coding=utf-8
+"""
+MOTP benchmarks
+
+Times `encrypt`, `decrypt` and `destroy` on synthetic files and on batches of small files, and writes the results as
+JSON so runs can be compared.
+
+USAGE
+-----
+python benchmark.py [--sizes 1K,1M,64M,1G] [--batches 1000x4K] [--output results.json] [--compare old.json]
+
+Run with --help for all options. Each case runs in its own process, and its input files are made in another one
+before it starts, so its peak memory is not affected by the other cases or by the setup. The fastest of --repeat runs
+is kept. For each case this records the wall time, the speed in bytes per second, the peak RSS, the read and write
+syscalls (Linux only), and for single files the time spent in each stage (reading, compressing, generating the pad,
+XORing, tagging and writing). Batches run on a thread pool, so their stages are not recorded, and `destroy` only writes
+the key, so it has no speed.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+import numpy  # https://numpy.org/install/
+
+import MOTP
+
+units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+password = 'benchmark'
+
+
+def parse_size(size: str) -> int:
+    """
+    This parses a size like '4K', '64M' or '2G'.
+    :param str size: This is the size.
+    :return: Returns the size in bytes.
+    :rtype: int
+    """
+    size = size.strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def write_file(file_path: str, size: int) -> None:
+    """
+    This writes a file of random data. One random block is repeated, since the content does not change the speed.
+    :param str file_path: This is the path of the file.
+    :param int size: This is the size (in bytes) of the file.
+    """
+    block = os.urandom(min(size, 1024 * 1024))
+    with open(file_path, 'wb') as file:
+        for _ in range(size // len(block) if block else 0):
+            file.write(block)
+        file.write(block[:size % len(block)] if block else b'')
+
+
+def io_counters() -> typing.Union[typing.Dict[str, int], None]:
+    """
+    This reads the I/O counters of this process.
+    :return: Returns the read and write syscall counts, or None if they are not available (outside of Linux).
+    :rtype: dict or None
+    """
+    try:
+        with open('/proc/self/io') as file:
+            counters = dict(line.split(': ') for line in file.read().splitlines())
+    except OSError:
+        return None
+    return {'read': int(counters['syscr']), 'write': int(counters['syscw'])}
+
+
+def peak_rss() -> typing.Union[int, None]:
+    """
+    This gets the peak memory use of this process.
+    :return: Returns the peak RSS in bytes, or None if it is not available (on Windows).
+    :rtype: int or None
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # macOS reports bytes, Linux reports KiB.
+
+
+def case_files(operation: str, count: int, directory: str) -> typing.List[str]:
+    """
+    This lists the input files of a case.
+    :param str operation: This is 'encrypt', 'decrypt' or 'destroy'.
+    :param int count: This is the number of files.
+    :param str directory: This is the directory of the files.
+    :return: Returns the paths of the files.
+    :rtype: list
+    """
+    extension = '.bin' if operation == 'encrypt' else '.bin.MOTP'
+    return [os.path.join(directory, '{index}{extension}'.format(index=index, extension=extension))
+            for index in range(count)]
+
+
+def set_up_case(operation: str, size: int, count: int, directory: str) -> None:
+    """
+    This creates the input files of a case. It runs in its own process, so encrypting the inputs of `decrypt` and
+    `destroy` cases does not count towards the peak memory of the case.
+    :param str operation: This is 'encrypt', 'decrypt' or 'destroy'.
+    :param int size: This is the size (in bytes) of each file.
+    :param int count: This is the number of files.
+    :param str directory: This is the directory to create the files in.
+    """
+    file_paths = case_files('encrypt', count, directory)
+    for file_path in file_paths:
+        write_file(file_path, size)
+    if operation != 'encrypt':
+        batch = MOTP.encrypt_many(file_paths, password)
+        if batch.errors:
+            raise batch.errors[0].error
+
+
+def run_case(operation: str, size: int, count: int, directory: str, workers: int, memory_map: bool) -> dict:
+    """
+    This runs one case in this process, on the files made by `set_up_case`.
+    :param str operation: This is 'encrypt', 'decrypt' or 'destroy'.
+    :param int size: This is the size (in bytes) of each file.
+    :param int count: This is the number of files. More than one file is run as a batch.
+    :param str directory: This is the directory of the files.
+    :param int workers: This is the number of threads used to generate the pad.
+    :param bool memory_map: If this is set to True, the files are memory-mapped.
+    :return: Returns the result of the case. The time spent in each stage (see `MOTP.Progress`) is only recorded for
+        single files, since the files of a batch run on a thread pool without a Progress. Speeds are not recorded for
+        `destroy`.
+    :rtype: dict
+    """
+    file_paths = case_files(operation, count, directory)
+    progress = MOTP.Progress() if count == 1 and operation != 'destroy' else None
+    before = io_counters()
+    start = time.perf_counter()
+    if count > 1:
+        if operation == 'destroy':
+            batch = MOTP.destroy_many(file_paths)
+        else:
+            function = MOTP.encrypt_many if operation == 'encrypt' else MOTP.decrypt_many
+            batch = function(file_paths, password, workers=workers, memory_map=memory_map)
+        if batch.errors:
+            raise batch.errors[0].error
+    elif operation == 'encrypt':
+        MOTP._encrypt_file(file_paths[0], password, workers=workers, memory_map=memory_map, progress=progress)
+    elif operation == 'decrypt':
+        MOTP._decrypt_file(file_paths[0], password, workers=workers, memory_map=memory_map, progress=progress)
+    else:
+        MOTP._destroy_file(file_paths[0])
+    seconds = time.perf_counter() - start
+    after = io_counters()
+    total = size * count
+    return {
+        'operation': operation,
+        'size': size,
+        'count': count,
+        'workers': workers,
+        'memory_map': memory_map,
+        'seconds': seconds,
+        'bytes_per_second': total / seconds if seconds and operation != 'destroy' else None,
+        # `destroy` only writes the key, so the size of the files says nothing about its speed.
+        'peak_rss': peak_rss(),
+        'syscalls': {name: after[name] - before[name] for name in after} if before and after else None,
+        'stages': dict(progress.seconds) if progress is not None else None,
+    }
+
+
+def run_cases(cases: typing.List[typing.Tuple[str, int, int]], workers: int, memory_map: bool,
+              directory: typing.Union[str, None], repeat: int) -> typing.List[dict]:
+    """
+    This runs every case in its own process.
+    :param list cases: These are the cases, as (operation, size, count) tuples.
+    :param int workers: This is the number of threads used to generate the pad.
+    :param bool memory_map: If this is set to True, the files are memory-mapped.
+    :param directory: This is where the files are created. If none is provided, a temporary directory is used.
+    :type directory: str or None
+    :param int repeat: This is the number of times each case is run. The fastest run is kept.
+    :return: Returns the results.
+    :rtype: list
+    """
+    results = []
+    for operation, size, count in cases:
+        runs = []
+        for _ in range(repeat):
+            case_directory = tempfile.mkdtemp(prefix='motp-benchmark-', dir=directory)
+            try:
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--set-up-case', operation, str(size),
+                                str(count), case_directory], check=True)
+                arguments = [sys.executable, os.path.abspath(__file__), '--run-case', operation, str(size),
+                             str(count), case_directory, '--workers', str(workers)]
+                output = subprocess.run(arguments + (['--memory-map'] if memory_map else []), check=True,
+                                        stdout=subprocess.PIPE).stdout
+            finally:
+                shutil.rmtree(case_directory, ignore_errors=True)
+            runs.append(json.loads(output))
+        result = min(runs, key=lambda run: run['seconds'])
+        results.append(result)
+        message = '{operation:>8} {count:>6} x {size:>12,} bytes: {seconds:10.4f} s {speed:>16} bytes/s {rss:>14} RSS'
+        print(message.format(operation=operation, count=count, size=size, seconds=result['seconds'],
+                             speed='{speed:,}'.format(speed=round(result['bytes_per_second']))
+                             if result['bytes_per_second'] else '-',
+                             rss='{rss:,}'.format(rss=result['peak_rss']) if result['peak_rss'] else '-'),
+              file=sys.stderr)
+    return results
+
+
+def compare(old: dict, new: dict) -> None:
+    """
+    This prints how the speed of every case changed between two runs.
+    :param dict old: This is the earlier run.
+    :param dict new: This is the later run.
+    """
+    def key(result: dict) -> tuple:
+        return result['operation'], result['size'], result['count'], result['workers'], result['memory_map']
+
+    old_results = {key(result): result for result in old['results']}
+    for result in new['results']:
+        old_result = old_results.get(key(result))
+        if not old_result or not old_result['bytes_per_second'] or not result['bytes_per_second']:
+            continue
+        change = result['bytes_per_second'] / old_result['bytes_per_second'] - 1
+        print('{operation:>8} {count:>6} x {size:>12,} bytes: {change:+7.1%} speed, {rss} peak RSS'.format(
+            operation=result['operation'], count=result['count'], size=result['size'], change=change,
+            rss='{change:+7.1%}'.format(change=result['peak_rss'] / old_result['peak_rss'] - 1)
+            if result['peak_rss'] and old_result['peak_rss'] else '-'))
+
+
+def main(arguments: typing.Union[typing.List[str], None] = None) -> int:
+    """
+    This is the command line interface.
+    :param arguments: These are the command line arguments. If none are provided, sys.argv is used. Defaults to None.
+    :type arguments: list or None
+    :return: Returns the exit code.
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description='MOTP benchmarks')
+    parser.add_argument('--sizes', default='1K,1M,64M,1G', help='comma-separated file sizes (default: 1K,1M,64M,1G)')
+    parser.add_argument('--batches', default='1000x4K', help='comma-separated COUNTxSIZE batches (default: 1000x4K)')
+    parser.add_argument('--operations', default='encrypt,decrypt,destroy', help='comma-separated operations')
+    parser.add_argument('--workers', type=int, default=1, help='threads used to generate the pad')
+    parser.add_argument('--memory-map', action='store_true', help='memory-map the files')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each case; the fastest is kept (default: 3)')
+    parser.add_argument('--directory', help='where to create the files (default: the temporary directory)')
+    parser.add_argument('--output', help='file to write the JSON results to (default: standard output)')
+    parser.add_argument('--compare', metavar='JSON', help='earlier results to compare with')
+    parser.add_argument('--set-up-case', nargs=4, metavar=('OPERATION', 'SIZE', 'COUNT', 'DIRECTORY'),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--run-case', nargs=4, metavar=('OPERATION', 'SIZE', 'COUNT', 'DIRECTORY'),
+                        help=argparse.SUPPRESS)
+    arguments = parser.parse_args(arguments)
+    if arguments.set_up_case:
+        operation, size, count, directory = arguments.set_up_case
+        set_up_case(operation, int(size), int(count), directory)
+        return 0
+    if arguments.run_case:
+        operation, size, count, directory = arguments.run_case
+        json.dump(run_case(operation, int(size), int(count), directory, arguments.workers, arguments.memory_map),
+                  sys.stdout)
+        return 0
+    operations = [operation for operation in arguments.operations.split(',') if operation]
+    cases = [(operation, parse_size(size), 1) for size in arguments.sizes.split(',') if size
+             for operation in operations]
+    for batch in arguments.batches.split(','):
+        if batch:
+            count, size = batch.lower().split('x')
+            cases.extend((operation, parse_size(size), int(count)) for operation in operations)
+    run = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'format_version': MOTP.format_version,
+            'buffer_size': MOTP.default_buffer_size,
+        },
+        'results': run_cases(cases, arguments.workers, arguments.memory_map, arguments.directory, arguments.repeat),
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(run, file, indent=2)
+    else:
+        json.dump(run, sys.stdout, indent=2)
+        print()
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            compare(json.load(file), run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
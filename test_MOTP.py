@@ -0,0 +1,350 @@
+# coding=utf-8
+"""
+MOTP tests
+
+Round trips for every way of encrypting and decrypting a file, resuming in-place jobs after an interruption at every
+step, and catching changed or cut off version 3 files.
+
+USAGE
+-----
+python -m pytest test_MOTP.py
+"""
+import io
+import os
+
+import pytest  # https://docs.pytest.org/
+
+import MOTP
+
+password = 'test password'
+chunk_size = 4096
+data = os.urandom(5 * chunk_size + 123)  # This is more than one chunk and does not end on a chunk boundary.
+block_half = os.urandom(MOTP.default_block_size // 2)  # This is repeated with zeros by `block_data`.
+
+
+class Interrupted(Exception):
+    """
+    This is raised in place of a crash.
+    """
+
+
+def write_plain(directory) -> str:
+    """
+    This writes the test data to a file.
+    :param directory: This is the directory of the file.
+    :return: Returns the path of the file.
+    :rtype: str
+    """
+    file_path = str(directory / 'data.bin')
+    with open(file_path, 'wb') as file:
+        file.write(data)
+    return file_path
+
+
+def read(file_path: str) -> bytes:
+    """
+    This reads a whole file.
+    :param str file_path: This is the path of the file.
+    :return: Returns the contents of the file.
+    :rtype: bytes
+    """
+    with open(file_path, 'rb') as file:
+        return file.read()
+
+
+def decrypted(file_path: str, key: str = password) -> bytes:
+    """
+    This reads the decrypted contents of an encrypted file without changing it.
+    :param str file_path: This is the path of the encrypted file.
+    :param str key: This is the password. Defaults to `password`.
+    :return: Returns the decrypted data.
+    :rtype: bytes
+    """
+    with MOTP.open_decrypted(file_path, key) as file:
+        return file.read()
+
+
+def crash_on_sync(monkeypatch, count: int) -> None:
+    """
+    This makes the sync with the given number raise `Interrupted`, so a job stops as if the machine crashed before the
+    data was on disk. Every chunk of an in-place job is synced to the journal and then to the file.
+    :param monkeypatch: This is the pytest fixture.
+    :param int count: This is the number of syncs that succeed first.
+    """
+    syncs = [0]
+
+    def sync(descriptor: int) -> None:
+        syncs[0] += 1
+        if syncs[0] > count:
+            raise Interrupted
+        real_fsync(descriptor)
+
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', sync)
+    if hasattr(os, 'fdatasync'):
+        monkeypatch.setattr(os, 'fdatasync', sync)
+
+
+def count_syncs(monkeypatch, job) -> int:
+    """
+    This counts the syncs of a job that is not interrupted.
+    :param monkeypatch: This is the pytest fixture.
+    :param job: This is the job.
+    :return: Returns the number of syncs.
+    :rtype: int
+    """
+    calls = []
+    real_fsync = os.fsync
+
+    def sync(descriptor: int) -> None:
+        calls.append(descriptor)
+        real_fsync(descriptor)
+
+    monkeypatch.setattr(os, 'fsync', sync)
+    if hasattr(os, 'fdatasync'):
+        monkeypatch.setattr(os, 'fdatasync', sync)
+    job()
+    monkeypatch.undo()
+    return len(calls)
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'memory_map': True},
+    {'workers': 3},
+    {'workers': 3, 'memory_map': True},
+    {'in_place': True},
+], ids=['copy', 'memory_map', 'workers', 'memory_map_workers', 'in_place'])
+def test_round_trip(tmp_path, options):
+    file_path = write_plain(tmp_path)
+    encrypted_file_path = MOTP._encrypt_file(file_path, password, chunk_size, **options)
+    assert encrypted_file_path == file_path + '.MOTP' and not os.path.exists(file_path)
+    assert read(encrypted_file_path)[:5] == b'MOTP2' and decrypted(encrypted_file_path) == data
+    assert MOTP._decrypt_file(encrypted_file_path, password, chunk_size, **options) == file_path
+    assert read(file_path) == data and not os.path.exists(encrypted_file_path)
+
+
+def test_round_trip_empty(tmp_path):
+    file_path = str(tmp_path / 'empty.bin')
+    open(file_path, 'wb').close()
+    for in_place in (False, True):
+        MOTP._decrypt_file(MOTP._encrypt_file(file_path, password, in_place=in_place), password, in_place=in_place)
+        assert read(file_path) == b''
+
+
+def test_stream_round_trip():
+    encrypted = io.BytesIO()
+    assert MOTP.encrypt_stream(io.BytesIO(data), encrypted, password, chunk_size) == len(data)
+    output = io.BytesIO()
+    assert MOTP.decrypt_stream(io.BytesIO(encrypted.getvalue()), output, password, chunk_size) == len(data)
+    assert output.getvalue() == data
+
+
+@pytest.mark.parametrize('in_place', [False, True], ids=['copy', 'in_place'])
+def test_rekey(tmp_path, in_place):
+    encrypted_file_path = MOTP._encrypt_file(write_plain(tmp_path), password, chunk_size)
+    MOTP.rekey(encrypted_file_path, password, 'new password', in_place, chunk_size)
+    assert decrypted(encrypted_file_path, 'new password') == data
+    assert not os.path.exists(encrypted_file_path + '.journal') and not os.path.exists(encrypted_file_path + '.rekey')
+
+
+def test_resume_encrypt(tmp_path, monkeypatch):
+    file_path = write_plain(tmp_path)
+    syncs = count_syncs(monkeypatch, lambda: MOTP._encrypt_file(file_path, password, chunk_size, in_place=True))
+    assert syncs > 2 * -(-len(data) // chunk_size)  # Every chunk is synced to the journal and then to the file.
+    for count in range(syncs):
+        os.remove(file_path + '.MOTP')
+        write_plain(tmp_path)
+        crash_on_sync(monkeypatch, count)
+        with pytest.raises(Interrupted):
+            MOTP._encrypt_file(file_path, password, chunk_size, in_place=True)
+        monkeypatch.undo()
+        assert MOTP._encrypt_file(file_path, password, chunk_size, in_place=True) == file_path + '.MOTP'
+        assert decrypted(file_path + '.MOTP') == data and not os.path.exists(file_path + '.MOTP.journal')
+
+
+def test_resume_decrypt(tmp_path, monkeypatch):
+    file_path = write_plain(tmp_path)
+    encrypted = read(MOTP._encrypt_file(file_path, password, chunk_size))
+    syncs = count_syncs(monkeypatch, lambda: MOTP._decrypt_file(file_path + '.MOTP', password, chunk_size,
+                                                                in_place=True))
+    assert syncs > 2 * -(-len(data) // chunk_size)  # Every chunk is synced to the journal and then to the file.
+    for count in range(syncs):
+        os.remove(file_path)
+        with open(file_path + '.MOTP', 'wb') as file:
+            file.write(encrypted)
+        crash_on_sync(monkeypatch, count)
+        with pytest.raises(Interrupted):
+            MOTP._decrypt_file(file_path + '.MOTP', password, chunk_size, in_place=True)
+        monkeypatch.undo()
+        MOTP.decrypt(file_path + '.MOTP', password, buffer_size=chunk_size, in_place=True)
+        # `decrypt` has to resume from the journal, since the header may already be overwritten.
+        assert read(file_path) == data and not os.path.exists(file_path + '.MOTP.journal')
+
+
+def test_resume_rekey(tmp_path, monkeypatch):
+    encrypted_file_path = MOTP._encrypt_file(write_plain(tmp_path), password, chunk_size)
+    encrypted = read(encrypted_file_path)
+    syncs = count_syncs(monkeypatch, lambda: MOTP.rekey(encrypted_file_path, password, 'new password', True,
+                                                        chunk_size))
+    assert syncs > 2 * -(-len(data) // chunk_size)  # Every chunk is synced to the journal and then to the file.
+    for count in range(syncs):
+        with open(encrypted_file_path, 'wb') as file:
+            file.write(encrypted)
+        crash_on_sync(monkeypatch, count)
+        with pytest.raises(Interrupted):
+            MOTP.rekey(encrypted_file_path, password, 'new password', True, chunk_size)
+        monkeypatch.undo()
+        with pytest.raises(ValueError):
+            MOTP._destroy_file(encrypted_file_path)  # The journal still holds both keys.
+        MOTP.rekey(encrypted_file_path, password, 'new password', True, chunk_size)
+        assert decrypted(encrypted_file_path, 'new password') == data
+        assert not os.path.exists(encrypted_file_path + '.journal')
+
+
+def test_resume_after_rename(tmp_path, monkeypatch):
+    file_path = write_plain(tmp_path)
+    real_remove = os.remove
+
+    def remove(path: str) -> None:
+        if path.endswith('.journal'):
+            raise Interrupted
+        real_remove(path)
+
+    monkeypatch.setattr(os, 'remove', remove)
+    with pytest.raises(Interrupted):
+        MOTP._encrypt_file(file_path, password, chunk_size, in_place=True)
+    monkeypatch.undo()
+    assert not os.path.exists(file_path) and os.path.exists(file_path + '.MOTP.journal')
+    MOTP._encrypt_file(file_path, password, chunk_size, in_place=True)
+    assert decrypted(file_path + '.MOTP') == data and not os.path.exists(file_path + '.MOTP.journal')
+
+
+def compressions() -> list:
+    """
+    This lists the compressions that can be tested here.
+    :return: Returns None (no compression) and every compression that is installed.
+    :rtype: list
+    """
+    available = [None]
+    for compression in MOTP.compressions:
+        try:
+            MOTP._codec(compression)
+        except ImportError:
+            continue
+        available.append(compression)
+    return available
+
+
+def encrypt_blocks(tmp_path, compression: str, size: int = 3 * MOTP.default_block_size + 5) -> str:
+    """
+    This encrypts a file of several blocks in the version 3 format. Half of every block is zeros, so it compresses.
+    :param tmp_path: This is the directory of the file.
+    :param compression: This is the compression, or None for tags only.
+    :type compression: str or None
+    :param int size: This is the size of the data. Defaults to three blocks and a bit.
+    :return: Returns the path of the encrypted file.
+    :rtype: str
+    """
+    file_path = str(tmp_path / 'blocks.bin')
+    with open(file_path, 'wb') as file:
+        file.write(block_data(size))
+    return MOTP._encrypt_file(file_path, password, 2 * MOTP.default_block_size, integrity=True,
+                              compression=compression)
+
+
+def block_data(size: int) -> bytes:
+    """
+    This makes the data of `encrypt_blocks`.
+    :param int size: This is the size of the data.
+    :return: Returns the data.
+    :rtype: bytes
+    """
+    return ((block_half + bytes(len(block_half))) * -(-size // MOTP.default_block_size))[:size]
+
+
+def fails(encrypted_file_path: str) -> list:
+    """
+    This checks that every way of reading an encrypted file fails, and that nothing is left behind.
+    :param str encrypted_file_path: This is the path of the encrypted file.
+    :return: Returns the error messages.
+    :rtype: list
+    """
+    messages = []
+    for job in (lambda: MOTP.verify(encrypted_file_path, password, workers=2),
+                lambda: MOTP._decrypt_file(encrypted_file_path, password, workers=2),
+                lambda: MOTP.decrypt_stream(io.BytesIO(read(encrypted_file_path)), io.BytesIO(), password),
+                lambda: decrypted(encrypted_file_path)):
+        with pytest.raises(ValueError) as error:
+            job()
+        messages.append(str(error.value))
+    assert not os.path.exists(encrypted_file_path[:-len('.MOTP')])
+    return messages
+
+
+@pytest.mark.parametrize('compression', compressions())
+@pytest.mark.parametrize('size', [0, 100, MOTP.default_block_size, 3 * MOTP.default_block_size + 5])
+def test_blocks_round_trip(tmp_path, compression, size):
+    encrypted_file_path = encrypt_blocks(tmp_path, compression, size)
+    assert MOTP.verify(encrypted_file_path, password) == encrypted_file_path
+    with MOTP.open_decrypted(encrypted_file_path, password) as file:
+        assert file.seek(0, io.SEEK_END) == size
+        file.seek(size // 3)
+        assert file.read(MOTP.default_block_size) == block_data(size)[size // 3:size // 3 + MOTP.default_block_size]
+    encrypted = read(encrypted_file_path)
+    output = io.BytesIO()
+    assert MOTP.decrypt_stream(io.BytesIO(encrypted), output, password, workers=2) == size
+    assert output.getvalue() == block_data(size)
+    MOTP._decrypt_file(encrypted_file_path, password, workers=2)
+    assert read(str(tmp_path / 'blocks.bin')) == block_data(size)
+
+
+@pytest.mark.parametrize('compression', compressions())
+def test_blocks_stream_round_trip(compression):
+    encrypted = io.BytesIO()
+    MOTP.encrypt_stream(io.BytesIO(data), encrypted, password, chunk_size, 2, integrity=True,
+                        compression=compression)
+    output = io.BytesIO()
+    assert MOTP.decrypt_stream(io.BytesIO(encrypted.getvalue()), output, password) == len(data)
+    assert output.getvalue() == data
+
+
+@pytest.mark.parametrize('compression', compressions())
+def test_wrong_password(tmp_path, compression):
+    encrypted_file_path = encrypt_blocks(tmp_path, compression)
+    with pytest.raises(ValueError):
+        MOTP.verify(encrypted_file_path, 'wrong password')
+    with pytest.raises(ValueError):
+        MOTP.DecryptedFile(encrypted_file_path, 'wrong password')
+
+
+@pytest.mark.parametrize('compression', compressions())
+def test_tampering(tmp_path, compression):
+    encrypted_file_path = encrypt_blocks(tmp_path, compression)
+    encrypted = read(encrypted_file_path)
+    header_size = encrypted.index(b'\n') + 1
+    step = MOTP.default_block_size // 2
+    for position in list(range(header_size, len(encrypted), step)) + [len(encrypted) - 1]:
+        # This changes every block, and the block index at the end of compressed files.
+        with open(encrypted_file_path, 'wb') as file:
+            file.write(encrypted[:position] + bytes([encrypted[position] ^ 1]) + encrypted[position + 1:])
+        fails(encrypted_file_path)
+    _, decryption_key, options = MOTP._read_header(io.BytesIO(encrypted))
+    options = dict(options, compress='lzma' if compression == 'zlib' else 'zlib')
+    with open(encrypted_file_path, 'wb') as file:
+        file.write(MOTP._build_header(decryption_key, options) + encrypted[header_size:])
+    fails(encrypted_file_path)  # The options in the header are covered by the tags.
+
+
+@pytest.mark.parametrize('compression', compressions())
+def test_truncation(tmp_path, compression):
+    encrypted_file_path = encrypt_blocks(tmp_path, compression)
+    encrypted = read(encrypted_file_path)
+    header_size = encrypted.index(b'\n') + 1
+    for size in (header_size, header_size + 1, len(encrypted) // 2, len(encrypted) - 1):
+        with open(encrypted_file_path, 'wb') as file:
+            file.write(encrypted[:size])
+        fails(encrypted_file_path)
+    with open(encrypted_file_path, 'wb') as file:
+        file.write(encrypted + b'\0')
+    fails(encrypted_file_path)